@@ -1,8 +1,6 @@
 import streamlit as st
 import os
-import time
 import base64
-from PIL import Image
 
 # ==========================================
 # 1. SETUP & STYLE CONFIGURATION
@@ -145,16 +143,24 @@ st.markdown("""
 # 2. BACKEND LOADING
 # ==========================================
 try:
-    from main_app import HandwritingBot, save_response_as_pdf
+    from main_app import HandwritingBot
     import ocr_page
     BACKEND_READY = True
 except ImportError as e:
     st.error(f"❌ Backend Error: {e}")
     BACKEND_READY = False
 
-# Initialize Bot
-if BACKEND_READY and "bot_engine" not in st.session_state:
-    st.session_state.bot_engine = HandwritingBot()
+# Initialize Bot (one per server process, shared by every browser session)
+@st.cache_resource
+def load_bot():
+    bot = HandwritingBot()
+    if bot.hand_model:
+        # lines from concurrent sessions are sampled in shared batches
+        bot.hand_model.start_batching()
+    return bot
+
+if BACKEND_READY:
+    bot_engine = load_bot()
 
 # Helper for SVG (Renders inside the 70% box)
 def render_svg(svg_path):
@@ -261,23 +267,12 @@ def show_writer_page():
         if st.button("Generate PDF (Left)"):
             if user_text and BACKEND_READY:
                 with st.spinner("Writing..."):
-                    ts = int(time.time())
-                    fname = f"manual_{ts}.svg"
-                    pdfname = f"manual_{ts}.pdf"
-                    
-                    st.session_state.bot_engine.hand_model.write(
-                        filename=fname, lines=user_text, biases=[bias_val], styles=[style_id],
-                        page_width=1860, page_height=3508, ruled=True
-                    )
-                    
-                    # PDF Helper
-                    base = fname.replace(".svg", "")
-                    pages = [f for f in os.listdir(".") if f.startswith(base) and f.endswith(".svg")]
-                    save_response_as_pdf(pages, pdfname)
-                    
-                    if os.path.exists(pdfname):
-                        with open(pdfname, "rb") as f:
-                            st.download_button("📥 Download PDF", f, "handwriting.pdf", "application/pdf")
+                    # the PDF is drawn in memory and handed straight to the download button
+                    pdf_bytes = bot_engine.hand_model.write(
+                        filename=None, lines=user_text, biases=[bias_val], styles=[style_id],
+                        page_width=1860, page_height=3508, ruled=True, backend="pdf"
+                    )[0]
+                    st.download_button("📥 Download PDF", pdf_bytes, "handwriting.pdf", "application/pdf")
 
     # RIGHT: AI CHATBOT
     with col_right:
@@ -300,7 +295,7 @@ def show_writer_page():
                         placeholder.markdown("Thinking...")
                         try:
                             sys_msg = "You are a helpful assistant. Output must be plain text suitable for handwriting."
-                            resp = st.session_state.bot_engine.client.chat.completions.create(
+                            resp = bot_engine.client.chat.completions.create(
                                 model="google/gemini-2.0-flash-001",
                                 messages=[{"role": "system", "content": sys_msg}] + st.session_state.messages
                             )
@@ -309,19 +304,14 @@ def show_writer_page():
                             st.session_state.messages.append({"role": "assistant", "content": bot_text})
                             
                             with st.status("✍️ Synthesizing...", expanded=True):
-                                ts = int(time.time())
-                                fname = f"bot_{ts}.svg"
-                                pdfname = f"bot_{ts}.pdf"
-                                st.session_state.bot_engine.hand_model.write(
-                                    filename=fname, lines=bot_text, biases=[bias_val], styles=[style_id],
-                                    page_width=1860, page_height=3508, ruled=True
+                                pdf_bytes = bot_engine.hand_model.write(
+                                    filename=None, lines=bot_text, biases=[bias_val], styles=[style_id],
+                                    page_width=1860, page_height=3508, ruled=True, backend="pdf"
+                                )[0]
+                                st.download_button(
+                                    "📥 Download Bot PDF", pdf_bytes, "bot_reply.pdf", "application/pdf",
+                                    key=f"btn_{len(st.session_state.messages)}"
                                 )
-                                base = fname.replace(".svg", "")
-                                pages = [f for f in os.listdir(".") if f.startswith(base) and f.endswith(".svg")]
-                                save_response_as_pdf(pages, pdfname)
-                                if os.path.exists(pdfname):
-                                    with open(pdfname, "rb") as f:
-                                        st.download_button("📥 Download Bot PDF", f, "bot_reply.pdf", "application/pdf", key=f"btn_{ts}")
                         except Exception as e: st.error(f"Error: {e}")
 
 # ==========================================
@@ -342,13 +332,13 @@ def show_reader_page():
     uploaded_file = st.file_uploader("Upload Image or PDF", type=["png", "jpg", "pdf"])
 
     if uploaded_file:
-        tname = f"temp_{uploaded_file.name}"
-        with open(tname, "wb") as f: f.write(uploaded_file.getbuffer())
+        # the upload is read from memory, nothing is written to disk
+        data = uploaded_file.getvalue()
 
         col1, col2 = st.columns([1, 2])
         with col1:
             if uploaded_file.type != "application/pdf":
-                st.image(Image.open(uploaded_file), caption="Preview", use_container_width=True)
+                st.image(data, caption="Preview", use_container_width=True)
             else:
                 st.info("📄 PDF Loaded")
 
@@ -361,19 +351,23 @@ def show_reader_page():
                             st.session_state.ocr_proc = p
                             st.session_state.ocr_mod = m
                         
-                        txt = ""
-                        if tname.endswith(".pdf"):
-                            doc = ocr_page.fitz.open(tname)
-                            for i, page in enumerate(doc):
-                                pix = page.get_pixmap(dpi=200)
-                                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                                txt += ocr_page.process_single_image(img, st.session_state.ocr_proc, st.session_state.ocr_mod, i+1) + "\n\n"
-                        else:
-                            img = Image.open(tname)
-                            txt = ocr_page.process_single_image(img, st.session_state.ocr_proc, st.session_state.ocr_mod)
+                        # repeated clicks and re-uploads are answered from the result cache
+                        ocr_cache = ocr_page.load_cache()
+
+                        # pages are shown as soon as they are read
+                        progress = st.progress(0.0, text="Reading page 1...")
+                        result_box = st.empty()
+                        pages = []
+                        for result in ocr_page.iter_document(data, st.session_state.ocr_proc, st.session_state.ocr_mod, cache=ocr_cache):
+                            pages.append(result.text)
+                            progress.progress(
+                                result.page_num / result.num_pages,
+                                text=f"Read page {result.page_num}/{result.num_pages} ({result.seconds:.1f}s)"
+                            )
+                            result_box.text_area("Result:", "\n\n".join(pages), height=400, key=f"ocr_result_{result.page_num}")
+                        txt = "\n\n".join(pages)
 
                         st.success("Done!")
-                        st.text_area("Result:", txt, height=400)
                         st.download_button("📥 Download .txt", txt, "ocr.txt")
 
 # ==========================================
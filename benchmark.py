@@ -0,0 +1,968 @@
+"""
+Benchmarks for the handwriting synthesis and OCR pipelines.
+
+Usage:
+    python benchmark.py <benchmark> [options]
+
+Run `python benchmark.py --help` for the list of benchmarks and
+`python benchmark.py <benchmark> --help` for the options of each one.
+Benchmarks that need the synthesis model expect `checkpoints/` and `styles/`
+next to this file, exactly like demo.Hand.
+"""
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from tests.reference import (
+    legacy_denoise, legacy_find_text, legacy_interpolate, legacy_layout_paths, legacy_rnn_free_run,
+    legacy_sample_output_mixture, page_lines, random_output_mixture, synthetic_page, synthetic_page_lines,
+    synthetic_page_offsets, synthetic_strokes
+)
+
+os.environ['TF_USE_LEGACY_KERAS'] = '1'
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+
+def document_text(num_pages):
+    """Text that Hand.write lays out on exactly num_pages default A4 pages."""
+    return " ".join(page_lines(25 * num_pages))
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (nan where unsupported)."""
+    if resource is None:
+        return float('nan')
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KiB on Linux
+    return rss / 2.0**20 if sys.platform == 'darwin' else rss / 2.0**10
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_isolated(argv):
+    """
+    Runs `python benchmark.py <argv>` in a fresh interpreter and returns the JSON dict it prints
+    on its last line.  Used for measurements (startup time, peak RSS) that a warm process would skew.
+    """
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__)] + list(argv),
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run_concurrently(fn, num_threads):
+    threads = [threading.Thread(target=fn) for _ in range(num_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def print_table(rows, columns):
+    widths = [max(len(c), *(len(_fmt(r[c])) for r in rows)) for c in columns]
+    print('  '.join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(_fmt(row[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+def _fmt(value):
+    return '{:.3f}'.format(value) if isinstance(value, float) else str(value)
+
+
+# ==========================================
+# SYNTHESIS
+# ==========================================
+def bench_startup(args):
+    """graph-build time, restore time and peak RSS of Hand() with and without inference_only"""
+    if args.mode:
+        start = time.perf_counter()
+        from demo import Hand
+        import_time = time.perf_counter() - start
+
+        hand, init_time = timed(Hand, inference_only=args.mode == 'inference')
+        # restoring a second time isolates the checkpoint read from the graph build
+        _, restore_time = timed(hand.nn.restore)
+        print(json.dumps({
+            'mode': args.mode,
+            'import_s': import_time,
+            'build_s': init_time - restore_time,
+            'restore_s': restore_time,
+            'graph_ops': len(hand.nn.graph.get_operations()),
+            'peak_rss_mb': peak_rss_mb(),
+        }))
+        return
+
+    rows = [run_isolated(['startup', '--mode', mode]) for mode in ('full', 'inference')]
+    print_table(rows, ['mode', 'import_s', 'build_s', 'restore_s', 'graph_ops', 'peak_rss_mb'])
+
+
+def bench_priming(args):
+    """per-page sampling latency with and without the primed-state cache"""
+    from demo import Hand
+
+    lines = page_lines()
+    rows = []
+    for cache_size in (0, 16):
+        hand = Hand(prime_cache_size=cache_size)
+        latencies = []
+        for _ in range(args.pages):
+            _, elapsed = timed(
+                hand._sample, lines, biases=[0.75] * len(lines), styles=[args.style] * len(lines)
+            )
+            latencies.append(elapsed)
+        cache = hand.prime_cache
+        rows.append({
+            'cache': 'on' if cache is not None else 'off',
+            'first_page_s': latencies[0],
+            'mean_page_s': sum(latencies[1:]) / max(len(latencies) - 1, 1),
+            'hits': cache.hits if cache is not None else '-',
+            'misses': cache.misses if cache is not None else '-',
+        })
+    print_table(rows, ['cache', 'first_page_s', 'mean_page_s', 'hits', 'misses'])
+
+
+def bench_sampling(args):
+    """sampling-loop throughput (steps/s and generated points/s) on full pages, two samples per step vs one"""
+    import rnn
+    import rnn_ops
+    from demo import Hand
+
+    lines = page_lines()
+    styles = None if args.style < 0 else [args.style] * len(lines)
+    rows = []
+    for loop, free_run in (('sample twice', legacy_rnn_free_run), ('sample once', rnn_ops.rnn_free_run)):
+        # Hand builds its graph on construction, with whichever free run rnn.py refers to
+        rnn.rnn_free_run = free_run
+        try:
+            hand = Hand()
+        finally:
+            rnn.rnn_free_run = rnn_ops.rnn_free_run
+        hand._sample(lines, biases=[0.75] * len(lines), styles=styles)  # warm-up, primes the cache
+
+        for page in range(args.pages):
+            strokes, elapsed = timed(hand._sample, lines, biases=[0.75] * len(lines), styles=styles)
+            steps = max(len(s) for s in strokes)
+            points = sum(len(s) for s in strokes)
+            rows.append({
+                'loop': loop,
+                'page': page + 1,
+                'page_s': elapsed,
+                'steps': steps,
+                'steps_per_s': steps / elapsed,
+                'points_per_s': points / elapsed,
+            })
+    print_table(rows, ['loop', 'page', 'page_s', 'steps', 'steps_per_s', 'points_per_s'])
+
+
+def bench_memory(args):
+    """peak RSS while sampling a page, with and without per-step states recorded"""
+    if args.record:
+        from demo import Hand
+
+        hand = Hand(record_sample_states=args.record == 'on')
+        lines = page_lines()
+        hand._primed_states([args.style])  # prime outside the measured page
+        loaded_rss = peak_rss_mb()
+        strokes, elapsed = timed(hand._sample, lines, biases=[0.75] * len(lines), styles=[args.style] * len(lines))
+
+        # floats per row of the recorded LSTMAttentionCellState: 6 lstm tensors, alpha/beta/kappa, w, phi
+        nn = hand.nn
+        state_floats = 6*nn.lstm_size + 3*nn.attention_mixture_components + 73 + 120
+        steps = max(len(s) for s in strokes)
+        print(json.dumps({
+            'record_states': args.record,
+            'page_s': elapsed,
+            'loaded_rss_mb': loaded_rss,
+            'peak_rss_mb': peak_rss_mb(),
+            'page_rss_mb': peak_rss_mb() - loaded_rss,
+            'state_ta_mb': 4.0 * steps * len(lines) * state_floats / 2.0**20 if args.record == 'on' else 0.0,
+        }))
+        return
+
+    rows = [run_isolated(['memory', '--record', record, '--style', str(args.style)]) for record in ('on', 'off')]
+    print_table(rows, ['record_states', 'page_s', 'loaded_rss_mb', 'peak_rss_mb', 'page_rss_mb', 'state_ta_mb'])
+
+
+def bench_compaction(args):
+    """generated points/s on mixed-length pages, with and without dropping finished lines"""
+    from demo import Hand
+
+    long_lines = page_lines()
+    # alternate full lines with short ones, like paragraph ends and headings
+    lines = [line if i % 3 else line.split()[0] for i, line in enumerate(long_lines)]
+    styles = [args.style] * len(lines)
+
+    rows = []
+    for segment_tsteps in (0, args.segment_tsteps):
+        hand = Hand(segment_tsteps=segment_tsteps)
+        hand._sample(lines, biases=[0.75] * len(lines), styles=styles)  # warm-up
+        points, elapsed = 0, 0.0
+        for _ in range(args.pages):
+            strokes, page_s = timed(hand._sample, lines, biases=[0.75] * len(lines), styles=styles)
+            points += sum(len(s) for s in strokes)
+            elapsed += page_s
+        rows.append({
+            'segment_tsteps': segment_tsteps or 'off',
+            'page_s': elapsed / args.pages,
+            'points_per_s': points / elapsed,
+        })
+    print_table(rows, ['segment_tsteps', 'page_s', 'points_per_s'])
+
+
+def stroke_statistics(strokes):
+    """Summary statistics of sampled lines, for comparing two samplers on the same page."""
+    import numpy as np
+
+    points = np.concatenate(strokes)
+    return {
+        'points_per_line': points.shape[0] / len(strokes),
+        'mean_abs_dx': float(np.abs(points[:, 0]).mean()),
+        'mean_abs_dy': float(np.abs(points[:, 1]).mean()),
+        'std_dx': float(points[:, 0].std()),
+        'std_dy': float(points[:, 1].std()),
+        'pen_up_rate': float(points[:, 2].mean()),
+    }
+
+
+def bench_attention(args):
+    """full vs. banded attention window: primed-state difference, sampled stroke statistics and steps/s"""
+    import numpy as np
+    from demo import Hand
+
+    lines = page_lines()
+    styles = [args.style] * len(lines)
+    biases = [0.75] * len(lines)
+    hands = {'full': Hand(attention_band=None), 'banded': Hand(attention_band=args.band)}
+
+    # priming feeds the style's own strokes, so any difference in the primed state is the band's error
+    primed = {}
+    for name, hand in hands.items():
+        chars, chars_len = hand._encode_chars(lines, prefixes=[hand.style_bank.prefix(s) for s in styles])
+        primed[name] = hand._prime(styles, chars, chars_len)
+    diff = max(np.abs(primed['full'][f] - primed['banded'][f]).max() for f in primed['full'])
+    print('max primed-state difference between full and banded windows: {:.2e}'.format(diff))
+
+    rows = []
+    for name, hand in hands.items():
+        hand._sample(lines, biases=biases, styles=styles)  # warm-up, primes the cache
+        strokes, elapsed, steps = [], 0.0, 0
+        for _ in range(args.pages):
+            page, page_s = timed(hand._sample, lines, biases=biases, styles=styles)
+            strokes += page
+            elapsed += page_s
+            steps += max(len(s) for s in page)
+        row = {'window': name, 'page_s': elapsed / args.pages, 'steps_per_s': steps / elapsed}
+        row.update(stroke_statistics(strokes))
+        rows.append(row)
+    print_table(rows, ['window', 'page_s', 'steps_per_s'] + list(stroke_statistics(strokes)))
+
+
+def bench_output_sampling(args):
+    """output-mixture sampler: in-graph cost per step vs. the tfp sampler"""
+    import tensorflow.compat.v1 as tf
+    from rnn_cell import sample_output_mixture
+
+    tf.disable_v2_behavior()
+    samplers = [('closed-form', sample_output_mixture)]
+    try:
+        import tensorflow_probability  # noqa: F401
+        samplers.append(('tfp', legacy_sample_output_mixture))
+    except ImportError:
+        print('tensorflow-probability is not installed, the tfp sampler is skipped')
+
+    # cost of the sampler alone inside a while loop, like one step of rnn_free_run
+    params = random_output_mixture(args.batch_size)
+    rows = []
+    for name, sampler in samplers:
+        with tf.Graph().as_default(), tf.Session() as session:
+            constants = [tf.constant(p) for p in params]
+            loop = tf.while_loop(
+                lambda i, total: i < args.steps,
+                lambda i, total: (i + 1, total + sampler(*constants)),
+                [tf.constant(0), tf.zeros([args.batch_size, 3])]
+            )
+            session.run(loop)  # warm-up
+            _, elapsed = timed(session.run, loop)
+        rows.append({'sampler': name, 'us_per_step': 1e6 * elapsed / args.steps})
+    print_table(rows, ['sampler', 'us_per_step'])
+
+
+def default_weights_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checkpoints', 'weights.npz')
+
+
+def bench_numpy_engine(args):
+    """NumPy vs. TensorFlow engine: cold start and page throughput"""
+    if args.engine:
+        start = time.perf_counter()
+        from demo import Hand
+        import_time = time.perf_counter() - start
+
+        hand, init_time = timed(Hand, engine=args.engine, weights_path=args.weights)
+        print(json.dumps({
+            'engine': args.engine,
+            'import_s': import_time,
+            'init_s': init_time,
+            'tensorflow_loaded': 'tensorflow' in sys.modules,
+            'peak_rss_mb': peak_rss_mb(),
+        }))
+        return
+
+    # the export and the cold starts run in fresh interpreters before this one imports anything,
+    # a child's peak RSS would otherwise start from this process's
+    weights = args.weights or default_weights_path()
+    if not os.path.exists(weights):
+        numpy_engine = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'numpy_engine.py')
+        subprocess.run(
+            [sys.executable, numpy_engine, '--checkpoint', os.path.dirname(weights), '--output', weights], check=True
+        )
+
+    rows = [run_isolated(['numpy_engine', '--engine', engine, '--weights', weights]) for engine in ('tf', 'numpy')]
+    print_table(rows, ['engine', 'import_s', 'init_s', 'tensorflow_loaded', 'peak_rss_mb'])
+
+    import numpy as np
+    from demo import Hand
+
+    tf_hand = Hand()
+    np_hand = Hand(engine='numpy', weights_path=weights)
+    lines = page_lines()[:args.lines]
+    styles = [args.style] * len(lines)
+    biases = np.full(len(lines), 0.75, dtype=np.float32)
+
+    rows = []
+    for name, hand in (('tf', tf_hand), ('numpy', np_hand)):
+        hand._sample(lines, biases=biases, styles=styles)  # warm-up, primes the cache
+        steps, points, elapsed = 0, 0, 0.0
+        for _ in range(args.pages):
+            strokes, page_s = timed(hand._sample, lines, biases=biases, styles=styles)
+            steps += max(len(s) for s in strokes)
+            points += sum(len(s) for s in strokes)
+            elapsed += page_s
+        rows.append({'engine': name, 'page_s': elapsed / args.pages, 'steps_per_s': steps / elapsed,
+                     'points_per_s': points / elapsed})
+    print_table(rows, ['engine', 'page_s', 'steps_per_s', 'points_per_s'])
+
+
+def bench_sessions(args):
+    """memory and first-response latency of N concurrent app sessions, one Hand each vs one shared Hand"""
+    if args.engine:
+        from demo import Hand
+
+        lock = threading.Lock()
+        shared = []
+
+        def get_hand():
+            if args.engine == 'per-session':
+                return Hand()
+            # same behaviour as st.cache_resource: the first session loads, the others wait for it
+            with lock:
+                if not shared:
+                    shared.append(Hand())
+            return shared[0]
+
+        latencies = []
+
+        def session():
+            start = time.perf_counter()
+            get_hand()._sample(['Hello from a new session'], biases=[0.75], styles=[0])
+            latencies.append(time.perf_counter() - start)
+
+        run_concurrently(session, args.sessions)
+        print(json.dumps({
+            'engine': args.engine,
+            'sessions': args.sessions,
+            'mean_first_response_s': sum(latencies) / len(latencies),
+            'max_first_response_s': max(latencies),
+            'peak_rss_mb': peak_rss_mb(),
+        }))
+        return
+
+    rows = [
+        run_isolated(['sessions', '--engine', engine, '--sessions', str(args.sessions)])
+        for engine in ('per-session', 'shared')
+    ]
+    print_table(rows, ['engine', 'sessions', 'mean_first_response_s', 'max_first_response_s', 'peak_rss_mb'])
+
+
+def bench_batching(args):
+    """throughput and latency of concurrent requests, each sampled alone vs micro-batched"""
+    from demo import Hand
+
+    hand = Hand()
+    lines = page_lines(args.lines)
+    hand._sample(lines, biases=[0.75] * len(lines), styles=[args.style] * len(lines))  # warm-up
+
+    def serve(sample):
+        latencies = []
+
+        def request():
+            start = time.perf_counter()
+            sample(lines, biases=[0.75] * len(lines), styles=[args.style] * len(lines))
+            latencies.append(time.perf_counter() - start)
+
+        _, elapsed = timed(run_concurrently, request, args.requests)
+        return {
+            'lines_per_s': args.requests * len(lines) / elapsed,
+            'mean_latency_s': sum(latencies) / len(latencies),
+            'max_latency_s': max(latencies),
+        }
+
+    rows = [dict(serve(hand._sample), mode='one batch per request')]
+    scheduler = hand.start_batching(max_batch_size=args.max_batch_size, max_wait=args.max_wait)
+    rows.append(dict(serve(scheduler.sample), mode='scheduler ({} batches)'.format(scheduler.batches_run)))
+    print_table(rows, ['mode', 'lines_per_s', 'mean_latency_s', 'max_latency_s'])
+
+
+def bench_document(args):
+    """end-to-end time of a multi-page document to PDF, sequential vs pipelined writer"""
+    from demo import Hand
+    from pdf_export import SvgPdfWriter
+
+    hand = Hand()
+    text = document_text(args.pages)
+    hand._sample(page_lines(), biases=[0.75] * 25, styles=[args.style] * 25)  # warm-up
+
+    def sequential(out_dir):
+        svgs = hand.write(os.path.join(out_dir, 'doc.svg'), text, biases=[0.75], styles=[args.style], pipeline=False)
+        pdf = SvgPdfWriter(os.path.join(out_dir, 'doc.pdf'))
+        for svg in svgs:
+            pdf.add_page(svg)
+        pdf.save()
+
+    def pipelined(out_dir):
+        pdf = SvgPdfWriter(os.path.join(out_dir, 'doc.pdf'))
+        hand.write(os.path.join(out_dir, 'doc.svg'), text, biases=[0.75], styles=[args.style], on_page=pdf.add_page)
+        pdf.save()
+
+    rows = []
+    for name, fn in (('sequential', sequential), ('pipelined', pipelined)):
+        with tempfile.TemporaryDirectory() as out_dir:
+            _, elapsed = timed(fn, out_dir)
+        rows.append({'writer': name, 'pages': args.pages, 'total_s': elapsed, 'per_page_s': elapsed / args.pages})
+    print_table(rows, ['writer', 'pages', 'total_s', 'per_page_s'])
+
+
+def bench_pdf_export(args):
+    """PDF export time and peak RSS of a sampled multi-page document, via SVG + svglib vs direct"""
+    from demo import Hand
+
+    # Hand.write's default A4 layout
+    width, height = 1860, 3508
+    margins = {"left": 150, "right": 150, "top": 250, "bottom": 250}
+    line_gap, scale = int((height - margins["top"] - margins["bottom"]) / 25), 2.4
+
+    if args.backend:
+        with open(args.strokes, 'rb') as f:
+            pages = pickle.load(f)
+        hand = Hand()
+        loaded_rss = peak_rss_mb()
+        out_dir = os.path.dirname(args.strokes)
+        pdf_file = os.path.join(out_dir, args.backend + '.pdf')
+
+        def export():
+            if args.backend == 'svg':
+                from pdf_export import SvgPdfWriter
+                pdf = SvgPdfWriter(pdf_file, pagesize=(width, height))
+                for i, (lines, strokes) in enumerate(pages):
+                    svg_file = os.path.join(out_dir, 'page{}.svg'.format(i))
+                    hand._draw(strokes, lines, svg_file, width, height, margins, True, line_gap, scale)
+                    pdf.add_page(svg_file)
+            else:
+                from pdf_export import StrokePdfWriter
+                pdf = StrokePdfWriter(pdf_file, pagesize=(width, height))
+                for lines, strokes in pages:
+                    pdf.add_page(*hand._layout(strokes, lines, width, height, margins, True, line_gap, scale))
+            pdf.save()
+
+        _, elapsed = timed(export)
+        print(json.dumps({
+            'backend': args.backend,
+            'pages': len(pages),
+            'export_s': elapsed,
+            'per_page_s': elapsed / len(pages),
+            'export_rss_mb': peak_rss_mb() - loaded_rss,
+            'pdf_mb': os.path.getsize(pdf_file) / 2.0**20,
+        }))
+        return
+
+    # sample once, every backend then exports the same strokes in a fresh process
+    hand = Hand()
+    lines = page_lines(25 * args.pages)
+    pages = []
+    for i in range(0, len(lines), 25):
+        chunk = lines[i:i + 25]
+        pages.append((chunk, hand._sample(chunk, biases=[0.75] * len(chunk), styles=[args.style] * len(chunk))))
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        strokes_file = os.path.join(out_dir, 'strokes.pkl')
+        with open(strokes_file, 'wb') as f:
+            pickle.dump(pages, f)
+        rows = [run_isolated(['pdf_export', '--backend', backend, '--strokes', strokes_file]) for backend in ('svg', 'pdf')]
+    print_table(rows, ['backend', 'pages', 'export_s', 'per_page_s', 'export_rss_mb', 'pdf_mb'])
+
+
+def _legacy_svg_path(coords):
+    # Hand._draw's original per-point string concatenation, kept for comparison
+    path = ""
+    prev = 1.0
+    for x, y, eos in coords:
+        path += f"{'M' if prev else 'L'}{x},{y} "
+        prev = eos
+    return path
+
+
+def bench_svg_paths(args):
+    """SVG path encoding time and size for one laid out 25-line page, per-point loop vs drawing.svg_path"""
+    import drawing
+    from demo import Hand
+
+    hand = Hand()
+    lines = page_lines()
+    strokes = hand._sample(lines, biases=[0.75] * len(lines), styles=[args.style] * len(lines))
+    margins = {"left": 150, "right": 150, "top": 250, "bottom": 250}
+    _, paths = hand._layout(strokes, lines, 1860, 3508, margins, True, 120, 2.4)
+
+    encoders = [
+        ('loop', _legacy_svg_path),
+        ('absolute', lambda c: drawing.svg_path(c, precision=args.precision)),
+        ('relative', lambda c: drawing.svg_path(c, precision=args.precision, relative=True)),
+    ]
+    rows = []
+    for name, encode in encoders:
+        encoded, elapsed = timed(lambda: [[encode(c) for c in paths] for _ in range(args.repeat)])
+        rows.append({
+            'encoder': name,
+            'points': sum(len(c) for c in paths),
+            'page_ms': 1000 * elapsed / args.repeat,
+            'path_kb': sum(len(p) for p in encoded[0]) / 2.0**10,
+        })
+    print_table(rows, ['encoder', 'points', 'page_ms', 'path_kb'])
+
+
+def _legacy_assemble(hand, lines, styles):
+    # batch assembly before StyleBank: both style files loaded and decoded once per line
+    import numpy as np
+
+    def load_style(style):
+        x_p = np.load(os.path.join(hand.styles_dir, f"style-{style}-strokes.npy"))
+        c_p = np.load(os.path.join(hand.styles_dir, f"style-{style}-chars.npy")).tobytes().decode("utf-8")
+        return x_p, c_p
+
+    chars, chars_len = hand._encode_chars([load_style(style)[1] + " " + text for text, style in zip(lines, styles)])
+    x_prime = np.zeros([len(styles), 1200, 3])
+    for i, style in enumerate(styles):
+        x_p = load_style(style)[0]
+        x_prime[i, :len(x_p)] = x_p
+    return chars, chars_len, x_prime
+
+
+class _SkipPriming(object):
+
+    """Stands in for Hand's engine, so only the batch assembly of Hand._prime is timed."""
+
+    def prime(self, x_prime, x_prime_len, chars, chars_len):
+        return {}
+
+
+def _bank_prime(hand, lines, styles):
+    chars, chars_len = hand._encode_chars(lines, prefixes=[hand.style_bank.prefix(s) for s in styles])
+    return hand._prime(styles, chars, chars_len)
+
+
+def bench_style_bank(args):
+    """batch-assembly time (chars and priming strokes) of a 25-line page, per-line np.load vs StyleBank"""
+    from demo import Hand
+
+    hand = Hand()
+    hand.engine = _SkipPriming()
+    lines = page_lines()
+    rows = []
+    for mixed in (False, True):
+        styles = [i % len(hand.style_bank) for i in range(len(lines))] if mixed else [args.style] * len(lines)
+        for name, assemble in (('np.load', _legacy_assemble), ('StyleBank', _bank_prime)):
+            _, elapsed = timed(lambda: [assemble(hand, lines, styles) for _ in range(args.repeat)])
+            rows.append({'styles': 'mixed' if mixed else 'single', 'loader': name, 'page_ms': 1000 * elapsed / args.repeat})
+    print_table(rows, ['styles', 'loader', 'page_ms'])
+
+
+def bench_postprocess(args):
+    """drawing.denoise / interpolate per page, per-stroke loops vs vectorised"""
+    import drawing
+
+    page = [synthetic_strokes(args.points, seed) for seed in range(25)]
+    rows = []
+    for name, legacy, vectorised in (
+        ('denoise', legacy_denoise, drawing.denoise),
+        ('interpolate', legacy_interpolate, drawing.interpolate),
+    ):
+        for impl, fn in (('loop', legacy), ('vectorised', vectorised)):
+            _, elapsed = timed(lambda: [fn(coords) for _ in range(args.repeat) for coords in page])
+            rows.append({'function': name, 'implementation': impl, 'page_ms': 1000 * elapsed / args.repeat})
+    print_table(rows, ['function', 'implementation', 'page_ms'])
+
+
+def bench_layout(args):
+    """page post-processing time of Hand._layout, per-line loop vs padded batch"""
+    from demo import Hand
+
+    width, height, line_gap, scale = 1860, 3508, 100, 1.5
+    margins = {"top": 200, "bottom": 120, "left": 140, "right": 60}
+    strokes, lines = synthetic_page_offsets(args.lines, args.points)
+    rows = []
+    for impl, fn in (
+        ('loop', lambda: legacy_layout_paths(strokes, lines, width, margins, line_gap, scale)),
+        ('batched', lambda: Hand._layout(strokes, lines, width, height, margins, False, line_gap, scale)),
+    ):
+        _, elapsed = timed(lambda: [fn() for _ in range(args.repeat)])
+        rows.append({'implementation': impl, 'page_ms': 1000 * elapsed / args.repeat})
+    print_table(rows, ['implementation', 'page_ms'])
+
+
+# ==========================================
+# OCR
+# ==========================================
+def char_error_rate(reference, hypothesis):
+    """Levenshtein distance between the two strings, divided by the length of the reference."""
+    prev = list(range(len(hypothesis) + 1))
+    for i, r in enumerate(reference, 1):
+        cur = [i]
+        for j, h in enumerate(hypothesis, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h)))
+        prev = cur
+    return prev[-1] / max(1, len(reference))
+
+
+def bench_ocr_batching(args):
+    """TrOCR lines/s and page latency on CPU at several line batch sizes"""
+    import ocr_page
+
+    processor, model = ocr_page.load_model()
+    image = synthetic_page(args.lines)
+    ocr_page.process_single_image(image, processor, model, batch_size=1)  # warm-up
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        num_lines = len(ocr_page.remove_lines_and_find_text(image))
+        _, elapsed = timed(ocr_page.process_single_image, image, processor, model, batch_size=batch_size)
+        rows.append({'batch_size': batch_size, 'lines': num_lines, 'page_s': elapsed, 'lines_per_s': num_lines / elapsed})
+    print_table(rows, ['batch_size', 'lines', 'page_s', 'lines_per_s'])
+
+
+def synthetic_pdf(filename, num_pages, lines_per_page=30):
+    """Writes a scanned-looking PDF, one synthetic_page image per A4 page."""
+    import io
+    import fitz
+
+    with fitz.open() as doc:
+        for i in range(num_pages):
+            buf = io.BytesIO()
+            synthetic_page(lines_per_page, seed=i % 10).save(buf, format="PNG")
+            page = doc.new_page(width=595, height=842)
+            page.insert_image(page.rect, stream=buf.getvalue())
+        doc.save(filename)
+
+
+def bench_ocr_pipeline(args):
+    """pages/minute on a synthetic multi-page PDF, serial page loop vs background rasterise + segment"""
+    import fitz
+    import ocr_page
+
+    processor, model = ocr_page.load_model()
+    ocr_page.process_single_image(synthetic_page(), processor, model)  # warm-up
+
+    def serial(pdf_file):
+        with fitz.open(pdf_file) as doc:
+            return [
+                ocr_page.process_single_image(ocr_page.render_page(page), processor, model, i + 1, batch_size=args.batch_size)
+                for i, page in enumerate(doc)
+            ]
+
+    def pipelined(pdf_file):
+        return list(ocr_page.process_pdf(pdf_file, processor, model, batch_size=args.batch_size, lookahead=args.lookahead))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        pdf_file = os.path.join(out_dir, 'scan.pdf')
+        synthetic_pdf(pdf_file, args.pages)
+        for name, fn in (('serial', serial), ('pipelined', pipelined)):
+            _, elapsed = timed(fn, pdf_file)
+            rows.append({'mode': name, 'pages': args.pages, 'total_s': elapsed, 'pages_per_min': 60 * args.pages / elapsed})
+    print_table(rows, ['mode', 'pages', 'total_s', 'pages_per_min'])
+
+
+def bench_segmentation(args):
+    """line segmentation time per page, reference loop vs remove_lines_and_find_text"""
+    import ocr_page
+
+    page = synthetic_page()
+    rows = []
+    for name, fn in (('loop', legacy_find_text), ('vectorised', ocr_page.remove_lines_and_find_text)):
+        _, elapsed = timed(lambda: [fn(page) for _ in range(args.repeat)])
+        rows.append({'implementation': name, 'page_ms': 1000 * elapsed / args.repeat})
+    print_table(rows, ['implementation', 'page_ms'])
+
+
+def bench_ocr_trim(args):
+    """page latency and character error rate with full-width line crops vs ink-trimmed crops"""
+    import ocr_page
+
+    processor, model = ocr_page.load_model()
+    pages = [(synthetic_page(args.lines, seed=seed), synthetic_page_lines(args.lines, seed)) for seed in range(args.pages)]
+    ocr_page.process_single_image(pages[0][0], processor, model)  # warm-up
+
+    rows = []
+    for trim in (False, True):
+        elapsed, errors = 0.0, 0.0
+        for image, lines in pages:
+            text, page_s = timed(ocr_page.process_single_image, image, processor, model, trim=trim)
+            elapsed += page_s
+            errors += char_error_rate(" ".join(lines), text)
+        rows.append({'crops': 'trimmed' if trim else 'full-width', 'page_s': elapsed / len(pages), 'cer': errors / len(pages)})
+    print_table(rows, ['crops', 'page_s', 'cer'])
+
+
+def bench_ocr_cache(args):
+    """latency of OCRing the same document again, without and with the persistent result cache"""
+    import ocr_page
+    from ocr_cache import OcrCache
+
+    processor, model = ocr_page.load_model()
+    ocr_page.process_single_image(synthetic_page(), processor, model)  # warm-up
+
+    rows = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        pdf_file = os.path.join(out_dir, 'scan.pdf')
+        synthetic_pdf(pdf_file, args.pages)
+        image = synthetic_page()
+        cache = OcrCache(os.path.join(out_dir, 'ocr_cache.sqlite3'))
+
+        for run in range(1, args.runs + 1):
+            for name, use_cache in (('uncached', False), ('cached', True)):
+                c = cache if use_cache else None
+                hits, misses = cache.hits, cache.misses
+                _, pdf_s = timed(lambda: list(ocr_page.process_pdf(pdf_file, processor, model, cache=c)))
+                _, image_s = timed(ocr_page.process_single_image, image, processor, model, cache=c)
+                rows.append({
+                    'run': run, 'cache': name, 'pdf_s': pdf_s, 'image_s': image_s,
+                    'hits': cache.hits - hits, 'misses': cache.misses - misses,
+                })
+        cache.close()
+    print_table(rows, ['run', 'cache', 'pdf_s', 'image_s', 'hits', 'misses'])
+
+
+def bench_ocr_precision(args):
+    """TrOCR accuracy vs speed on a fixed set of line crops, fp32 vs int8 vs bf16 on CPU"""
+    if args.precision:
+        import ocr_page
+
+        (processor, model), load_s = timed(ocr_page.load_model, precision=args.precision, num_threads=args.threads)
+        image = synthetic_page(args.lines)
+        crops = [line[0].image for line in ocr_page.segment_page(image, trim=False)]
+        truth = synthetic_page_lines(args.lines)
+        ocr_page.recognize_lines(crops[:args.batch_size], processor, model, batch_size=args.batch_size)  # warm-up
+
+        texts, elapsed = timed(ocr_page.recognize_lines, crops, processor, model, batch_size=args.batch_size)
+        print(json.dumps({
+            'precision': args.precision,
+            'threads': args.threads or 'default',
+            'load_s': load_s,
+            'lines_per_s': len(crops) / elapsed,
+            'cer': sum(char_error_rate(t, h) for t, h in zip(truth, texts)) / len(crops),
+            'peak_rss_mb': peak_rss_mb(),
+        }))
+        return
+
+    rows = [
+        run_isolated(['ocr_precision', '--precision', precision, '--threads', str(args.threads),
+                      '--lines', str(args.lines), '--batch-size', str(args.batch_size)])
+        for precision in ('fp32', 'int8', 'bf16')
+    ]
+    print_table(rows, ['precision', 'threads', 'load_s', 'lines_per_s', 'cer', 'peak_rss_mb'])
+
+
+def bench_ocr_budget(args):
+    """tokens generated vs decode steps run per line, fixed max_new_tokens vs ink-width budgets"""
+    import ocr_page
+
+    processor, model = ocr_page.load_model()
+    image = synthetic_page(args.lines)
+    truth = synthetic_page_lines(args.lines)
+    lines = ocr_page.segment_page(image, trim=False)
+    crops = [line[0].image for line in lines]
+    budgets = [line[0].budget for line in lines]
+    ocr_page.recognize_lines(crops[:args.batch_size], processor, model, batch_size=args.batch_size)  # warm-up
+
+    rows = []
+    for num_beams in args.beams:
+        for name, line_budgets in (('fixed', None), ('ink-width', budgets)):
+            stats = ocr_page.DecodeStats()
+            texts, elapsed = timed(
+                ocr_page.recognize_lines, crops, processor, model, batch_size=args.batch_size,
+                budgets=line_budgets, num_beams=num_beams, stats=stats
+            )
+            rows.append(dict(
+                stats.summary(), budget=name, num_beams=num_beams, page_s=elapsed,
+                cer=sum(char_error_rate(t, h) for t, h in zip(truth, texts)) / len(texts),
+            ))
+    print_table(rows, ['budget', 'num_beams', 'page_s', 'cer', 'mean_budget', 'mean_tokens', 'mean_steps', 'wasted_steps'])
+
+
+BENCHMARKS = {
+    'startup': bench_startup,
+    'priming': bench_priming,
+    'sampling': bench_sampling,
+    'memory': bench_memory,
+    'compaction': bench_compaction,
+    'attention': bench_attention,
+    'output_sampling': bench_output_sampling,
+    'numpy_engine': bench_numpy_engine,
+    'sessions': bench_sessions,
+    'batching': bench_batching,
+    'document': bench_document,
+    'pdf_export': bench_pdf_export,
+    'svg_paths': bench_svg_paths,
+    'style_bank': bench_style_bank,
+    'postprocess': bench_postprocess,
+    'layout': bench_layout,
+    'ocr_batching': bench_ocr_batching,
+    'ocr_pipeline': bench_ocr_pipeline,
+    'segmentation': bench_segmentation,
+    'ocr_trim': bench_ocr_trim,
+    'ocr_cache': bench_ocr_cache,
+    'ocr_precision': bench_ocr_precision,
+    'ocr_budget': bench_ocr_budget,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for AI Scribe.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    p = subparsers.add_parser('startup', help=bench_startup.__doc__)
+    p.add_argument('--mode', choices=['full', 'inference'], help=argparse.SUPPRESS)
+
+    p = subparsers.add_parser('priming', help=bench_priming.__doc__)
+    p.add_argument('--pages', type=int, default=5, help='pages sampled per configuration')
+    p.add_argument('--style', type=int, default=0)
+
+    p = subparsers.add_parser('sampling', help=bench_sampling.__doc__)
+    p.add_argument('--pages', type=int, default=3)
+    p.add_argument('--style', type=int, default=0, help='style id, pass -1 to sample unprimed')
+
+    p = subparsers.add_parser('memory', help=bench_memory.__doc__)
+    p.add_argument('--style', type=int, default=0)
+    p.add_argument('--record', choices=['on', 'off'], help=argparse.SUPPRESS)
+
+    p = subparsers.add_parser('compaction', help=bench_compaction.__doc__)
+    p.add_argument('--pages', type=int, default=3)
+    p.add_argument('--style', type=int, default=0)
+    p.add_argument('--segment-tsteps', type=int, default=200)
+
+    p = subparsers.add_parser('attention', help=bench_attention.__doc__)
+    p.add_argument('--band', type=int, default=32, help='attention_band of the banded window')
+    p.add_argument('--style', type=int, default=0)
+    p.add_argument('--pages', type=int, default=3)
+
+    p = subparsers.add_parser('output_sampling', help=bench_output_sampling.__doc__)
+    p.add_argument('--batch-size', type=int, default=25)
+    p.add_argument('--steps', type=int, default=2000)
+
+    p = subparsers.add_parser('numpy_engine', help=bench_numpy_engine.__doc__)
+    p.add_argument('--weights', help='exported weights, by default checkpoints/weights.npz (exported if missing)')
+    p.add_argument('--lines', type=int, default=25)
+    p.add_argument('--style', type=int, default=0)
+    p.add_argument('--pages', type=int, default=2)
+    p.add_argument('--engine', choices=['tf', 'numpy'], help=argparse.SUPPRESS)
+
+    p = subparsers.add_parser('sessions', help=bench_sessions.__doc__)
+    p.add_argument('--sessions', type=int, default=4)
+    p.add_argument('--engine', choices=['per-session', 'shared'], help=argparse.SUPPRESS)
+
+    p = subparsers.add_parser('batching', help=bench_batching.__doc__)
+    p.add_argument('--requests', type=int, default=8, help='concurrent requests')
+    p.add_argument('--lines', type=int, default=5, help='lines per request')
+    p.add_argument('--style', type=int, default=0)
+    p.add_argument('--max-batch-size', type=int, default=25)
+    p.add_argument('--max-wait', type=float, default=0.05)
+
+    p = subparsers.add_parser('document', help=bench_document.__doc__)
+    p.add_argument('--pages', type=int, default=10)
+    p.add_argument('--style', type=int, default=0)
+
+    p = subparsers.add_parser('pdf_export', help=bench_pdf_export.__doc__)
+    p.add_argument('--pages', type=int, default=10)
+    p.add_argument('--style', type=int, default=0)
+    p.add_argument('--backend', choices=['svg', 'pdf'], help=argparse.SUPPRESS)
+    p.add_argument('--strokes', help=argparse.SUPPRESS)
+
+    p = subparsers.add_parser('svg_paths', help=bench_svg_paths.__doc__)
+    p.add_argument('--style', type=int, default=0)
+    p.add_argument('--precision', type=int, default=1)
+    p.add_argument('--repeat', type=int, default=20)
+
+    p = subparsers.add_parser('style_bank', help=bench_style_bank.__doc__)
+    p.add_argument('--style', type=int, default=0, help='style of the single-style page')
+    p.add_argument('--repeat', type=int, default=50)
+
+    p = subparsers.add_parser('postprocess', help=bench_postprocess.__doc__)
+    p.add_argument('--points', type=int, default=600, help='points per line of the synthetic 25-line page')
+    p.add_argument('--repeat', type=int, default=10)
+
+    p = subparsers.add_parser('layout', help=bench_layout.__doc__)
+    p.add_argument('--lines', type=int, default=25, help='lines on the synthetic page')
+    p.add_argument('--points', type=int, default=600, help='points per full line')
+    p.add_argument('--repeat', type=int, default=20)
+
+    p = subparsers.add_parser('ocr_batching', help=bench_ocr_batching.__doc__)
+    p.add_argument('--lines', type=int, default=30, help='text lines on the synthetic page')
+    p.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16])
+
+    p = subparsers.add_parser('ocr_pipeline', help=bench_ocr_pipeline.__doc__)
+    p.add_argument('--pages', type=int, default=50)
+    p.add_argument('--batch-size', type=int, default=8)
+    p.add_argument('--lookahead', type=int, default=2)
+
+    p = subparsers.add_parser('segmentation', help=bench_segmentation.__doc__)
+    p.add_argument('--repeat', type=int, default=20)
+
+    p = subparsers.add_parser('ocr_trim', help=bench_ocr_trim.__doc__)
+    p.add_argument('--pages', type=int, default=3)
+    p.add_argument('--lines', type=int, default=30, help='text lines per synthetic page')
+
+    p = subparsers.add_parser('ocr_cache', help=bench_ocr_cache.__doc__)
+    p.add_argument('--pages', type=int, default=5, help='pages of the synthetic PDF')
+    p.add_argument('--runs', type=int, default=3, help='times the same document is processed')
+
+    p = subparsers.add_parser('ocr_precision', help=bench_ocr_precision.__doc__)
+    p.add_argument('--lines', type=int, default=30, help='line crops recognised per precision')
+    p.add_argument('--batch-size', type=int, default=8)
+    p.add_argument('--threads', type=int, default=0, help='torch intra-op threads, 0 for the default')
+    p.add_argument('--precision', choices=['fp32', 'int8', 'bf16'], help=argparse.SUPPRESS)
+
+    p = subparsers.add_parser('ocr_budget', help=bench_ocr_budget.__doc__)
+    p.add_argument('--lines', type=int, default=30, help='text lines on the synthetic page')
+    p.add_argument('--batch-size', type=int, default=8)
+    p.add_argument('--beams', type=int, nargs='+', default=[1], help='num_beams settings to compare')
+
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
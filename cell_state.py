@@ -0,0 +1,11 @@
+from collections import namedtuple
+
+
+LSTMAttentionCellState = namedtuple(
+    'LSTMAttentionCellState',
+    ['h1', 'c1', 'h2', 'c2', 'h3', 'c3', 'alpha', 'beta', 'kappa', 'w', 'phi']
+)
+
+# Fields that have to be carried over when resuming from a saved state.  w and phi are functions
+# of alpha, beta, kappa and the character sequence, see LSTMAttentionCell.attend.
+CARRIED_STATE_FIELDS = LSTMAttentionCellState._fields[:9]
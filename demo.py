@@ -2,19 +2,93 @@ import os
 os.environ['TF_USE_LEGACY_KERAS'] = '1'
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
+from concurrent.futures import ThreadPoolExecutor
+import io
 import logging
+import numbers
 import numpy as np
 import svgwrite
 import textwrap
+import threading
 
 import drawing
-from rnn import rnn
+from cell_state import CARRIED_STATE_FIELDS
+from prime_cache import PrimeCache
+from scheduler import SynthesisScheduler
+from style_bank import StyleBank
+
+
+STROKE_WIDTH = 2.4
 
 
 class Hand(object):
 
-    def __init__(self):
+    def __init__(
+        self,
+        inference_only=True,
+        prime_cache_size=16,
+        prime_cache_dir=None,
+        segment_tsteps=200,
+        attention_band=None,
+        engine='tf',
+        weights_path=None,
+        **model_kwargs
+    ):
+        """
+        prime_cache_size: number of styles whose primed state is kept in memory, 0 disables the cache
+            and every call re-runs priming over the style strokes.
+        prime_cache_dir: optional directory (e.g. `styles/`) where primed states are also persisted.
+        segment_tsteps: lines are sampled in runs of this many steps, and lines that finished are
+            dropped from the batch between runs.  0 samples the whole batch in a single run.
+        attention_band: number of characters around the attention window's position that it is
+            evaluated over at each step, None evaluates it over the whole (up to 120 character) text.
+            The band is exact only while the attention components stay within it; that holds for a
+            trained model but is not checked, so it is off by default.
+        engine: 'tf' runs the TensorFlow graph restored from `checkpoints/`, 'numpy' runs
+            numpy_engine.NumpyEngine on exported weights and doesn't import TensorFlow at all.
+        weights_path: .npz written by numpy_engine.export_weights for the numpy engine, by default
+            `checkpoints/weights.npz`.
+        model_kwargs: extra rnn options, e.g. record_sample_states=True to keep per-step states.
+        """
         script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.styles_dir = os.path.join(script_dir, 'styles')
+        self.style_bank = StyleBank(self.styles_dir)
+        self.segment_tsteps = segment_tsteps
+        # one Hand is shared by every session of the app: model runs and the prime cache are
+        # serialised on this lock, so concurrent requests take turns one segment at a time
+        self.lock = threading.RLock()
+        self.scheduler = None
+        self.nn = None
+        self.engine = None
+
+        if engine == 'numpy':
+            from numpy_engine import NumpyEngine
+
+            self.engine = NumpyEngine(
+                weights_path or os.path.join(script_dir, 'checkpoints', 'weights.npz'),
+                attention_band=attention_band
+            )
+            self.state_sizes = self.engine.state_sizes
+            checkpoint = self.engine.checkpoint
+        elif engine == 'tf':
+            checkpoint = self._build_tf_model(script_dir, inference_only, attention_band, model_kwargs)
+        else:
+            raise ValueError("engine must be 'tf' or 'numpy', got {!r}".format(engine))
+
+        self.prime_cache = None
+        if prime_cache_size:
+            self.prime_cache = PrimeCache(
+                max_size=prime_cache_size,
+                cache_dir=prime_cache_dir,
+                # the banded window primes to a slightly different state than the full one
+                tag='{}-band{}'.format(checkpoint, attention_band)
+            )
+
+    def _build_tf_model(self, script_dir, inference_only, attention_band, model_kwargs):
+        # TensorFlow is only imported when the graph is used
+        from rnn import rnn
+        from tf_utils import shape
+
         self.nn = rnn(
             log_dir=os.path.join(script_dir, 'logs'),
             checkpoint_dir=os.path.join(script_dir, 'checkpoints'),
@@ -36,9 +110,14 @@ class Hand(object):
             grad_clip=10,
             lstm_size=400,
             output_mixture_components=20,
-            attention_mixture_components=10
+            attention_mixture_components=10,
+            attention_band=attention_band,
+            inference_only=inference_only,
+            **model_kwargs
         )
         self.nn.restore()
+        self.state_sizes = {f: shape(getattr(self.nn.sample_state, f), 1) for f in CARRIED_STATE_FIELDS}
+        return os.path.basename(self.nn.restored_model_path)
 
     def write(
         self,
@@ -49,8 +128,25 @@ class Hand(object):
         page_width=1860,
         page_height=3508,
         margins=None,
-        ruled=True
+        ruled=True,
+        on_page=None,
+        pipeline=True,
+        backend='svg'
     ):
+        """
+        Writes one SVG per page and returns their filenames.
+
+        filename: None writes nothing to disk, the pages are returned in memory instead: the SVG
+            markup of every page, or [the PDF's bytes] with backend='pdf'.
+        on_page: optional callback, called with each page's filename (or markup) as soon as that
+            page is saved (e.g. to append it to a PDF while later pages are still being sampled).
+        pipeline: sample the next page in the background while the current one is drawn.
+        backend: 'svg', or 'pdf' to draw every page straight into the single PDF `filename` with
+            reportlab, skipping the SVG round trip.  Returns [filename] and calls on_page(filename)
+            after each page in that case.
+        """
+        if backend not in ('svg', 'pdf'):
+            raise ValueError("backend must be 'svg' or 'pdf', got {!r}".format(backend))
         if margins is None:
             margins = {"left": 150, "right": 150, "top": 250, "bottom": 250}
 
@@ -89,69 +185,246 @@ class Hand(object):
         if styles is None: styles = [0] * total_lines
         elif len(styles) < total_lines: styles += [styles[-1]] * (total_lines - len(styles))
 
+        pages = [
+            (final_lines[i : i + LINES_PER_PAGE], biases[i : i + LINES_PER_PAGE], styles[i : i + LINES_PER_PAGE])
+            for i in range(0, total_lines, LINES_PER_PAGE)
+        ]
+        if self.scheduler is not None:
+            # queue every page up front, they are batched together with other requests' lines
+            pending = [self.scheduler.submit(*page) for page in pages]
+            sampled = ([future.result() for future in futures] for futures in pending)
+        elif pipeline:
+            sampled = self._sample_ahead(pages)
+        else:
+            sampled = (self._sample(*page) for page in pages)
+
+        if backend == 'pdf':
+            from pdf_export import StrokePdfWriter
+
+            out = io.BytesIO() if filename is None else filename
+            pdf = StrokePdfWriter(out, pagesize=(page_width, page_height), stroke_width=STROKE_WIDTH)
+            for (chunk_lines, _, _), strokes in zip(pages, sampled):
+                pdf.add_page(*self._layout(
+                    strokes, chunk_lines,
+                    page_width, page_height, margins, ruled,
+                    LINE_GAP, SCALE
+                ))
+                if on_page is not None:
+                    on_page(filename)
+            pdf.save()
+            return [out.getvalue() if filename is None else filename]
+
         generated_files = []
-        for page_num, i in enumerate(range(0, total_lines, LINES_PER_PAGE)):
-            chunk_lines = final_lines[i : i + LINES_PER_PAGE]
-            chunk_biases = biases[i : i + LINES_PER_PAGE]
-            chunk_styles = styles[i : i + LINES_PER_PAGE]
-            
-            page_filename = filename.replace(".svg", f"_p{page_num+1}.svg")
-            
-            strokes = self._sample(chunk_lines, biases=chunk_biases, styles=chunk_styles)
-            
-            self._draw(
+        for page_num, ((chunk_lines, _, _), strokes) in enumerate(zip(pages, sampled)):
+            page_filename = None if filename is None else filename.replace(".svg", f"_p{page_num+1}.svg")
+
+            svg = self._draw(
                 strokes, chunk_lines, page_filename,
                 page_width, page_height, margins, ruled,
                 LINE_GAP, SCALE
             )
-            generated_files.append(page_filename)
-            
+            page = svg if filename is None else page_filename
+            generated_files.append(page)
+            if on_page is not None:
+                on_page(page)
+
         return generated_files
 
+    def _sample_ahead(self, pages):
+        """
+        Yields the strokes of each page, sampling the next page on a worker thread while the
+        caller draws the current one.  session.run releases the GIL, so both overlap.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self._sample, *pages[0]) if pages else None
+            for next_page in pages[1:] + [None]:
+                strokes = future.result()
+                if next_page is not None:
+                    future = executor.submit(self._sample, *next_page)
+                yield strokes
+
+    def start_batching(self, max_batch_size=25, max_wait=0.05):
+        """
+        Routes the sampling of every write() through a SynthesisScheduler, so concurrent callers
+        sharing this Hand get their lines sampled in common batches.  See scheduler.py.
+        """
+        if self.scheduler is None:
+            self.scheduler = SynthesisScheduler(self, max_batch_size=max_batch_size, max_wait=max_wait)
+        return self.scheduler
+
+    def _validate_request(self, lines, biases=None, styles=None):
+        """
+        Raises ValueError for a request _sample can't run: lines that aren't strings, biases that
+        aren't numbers (None samples a line with the default bias of 0), unknown style ids, or
+        biases and styles with a different number of entries than lines.
+        """
+        if not all(isinstance(line, str) for line in lines):
+            raise ValueError('lines must be strings')
+        for name, values in (('biases', biases), ('styles', styles)):
+            if values is not None and len(values) and len(values) != len(lines):
+                raise ValueError('{} has {} entries for {} lines'.format(name, len(values), len(lines)))
+        if biases is not None and not all(b is None or isinstance(b, numbers.Real) for b in biases):
+            raise ValueError('biases must be numbers, got {}'.format(list(biases)))
+        if styles:
+            self.style_bank.validate(styles)
+
     def _sample(self, lines, biases=None, styles=None):
+        self._validate_request(lines, biases, styles)
         num_samples = len(lines)
         max_tsteps = 60 * max(len(l) for l in lines)
-        
-        x_prime = np.zeros([num_samples, 1200, 3])
-        x_prime_len = np.zeros([num_samples])
-        chars = np.zeros([num_samples, 120])
-        chars_len = np.zeros([num_samples])
 
         if styles:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            for i, (text, style) in enumerate(zip(lines, styles)):
-                x_p = np.load(os.path.join(script_dir, f"styles/style-{style}-strokes.npy"))
-                c_p = np.load(os.path.join(script_dir, f"styles/style-{style}-chars.npy")).tobytes().decode("utf-8")
-                encoded = drawing.encode_ascii(c_p + " " + text)
-                if len(encoded) > 120: encoded = encoded[:120]
-                
-                x_prime[i, :len(x_p)] = x_p
-                x_prime_len[i] = len(x_p)
-                chars[i, :len(encoded)] = encoded
-                chars_len[i] = len(encoded)
+            # each line attends over its style's transcription followed by its own text
+            chars, chars_len = self._encode_chars(lines, prefixes=[self.style_bank.prefix(s) for s in styles])
+            if self.prime_cache is not None:
+                state = self._primed_states(styles)
+            else:
+                state = self._prime(styles, chars, chars_len)
+            initial_input = None
         else:
-            for i, text in enumerate(lines):
-                encoded = drawing.encode_ascii(text)
-                if len(encoded) > 120: encoded = encoded[:120]
-                chars[i, :len(encoded)] = encoded
-                chars_len[i] = len(encoded)
-
-        [samples] = self.nn.session.run(
-            [self.nn.sampled_sequence],
-            feed_dict={
-                self.nn.prime: styles is not None,
-                self.nn.x_prime: x_prime,
-                self.nn.x_prime_len: x_prime_len,
-                self.nn.num_samples: num_samples,
-                self.nn.sample_tsteps: max_tsteps,
-                self.nn.c: chars,
-                self.nn.c_len: chars_len,
-                self.nn.bias: biases
-            }
-        )
+            chars, chars_len = self._encode_chars(lines)
+            state = {f: np.zeros([num_samples, self.state_sizes[f]]) for f in CARRIED_STATE_FIELDS}
+            initial_input = np.tile([[0.0, 0.0, 1.0]], [num_samples, 1])
+
+        samples = self._free_run(state, initial_input, chars, chars_len, biases, max_tsteps)
         return [s[~np.all(s == 0.0, axis=1)] for s in samples]
 
-    def _draw(self, strokes, lines, filename, width, height, margins, ruled, line_gap, scale):
+    def _free_run(self, state, initial_input, chars, chars_len, biases, max_tsteps):
+        """
+        Samples every line from its initial state until it terminates or max_tsteps is reached.
+
+        The loop runs in segments of self.segment_tsteps steps, each resuming from the final
+        state and last output of the previous one.  Lines that finished are removed from the
+        batch between segments, so a single long line doesn't keep the whole page computing.
+        If initial_input is None the first input is sampled from the initial state.
+        """
+        if biases is None:
+            biases = [None] * len(chars)
+        biases = np.array([0.0 if b is None else b for b in biases], dtype=np.float32)
+        active = np.arange(len(chars))
+        segments = [[] for _ in active]
+        steps = 0
+
+        while len(active) and steps < max_tsteps:
+            tsteps = min(self.segment_tsteps or max_tsteps, max_tsteps - steps)
+            with self.lock:
+                samples, final_state, terminated = self._run_segment(
+                    state, initial_input, chars[active], chars_len[active], biases[active], tsteps
+                )
+            for i, row in enumerate(active):
+                segments[row].append(samples[i])
+            steps += tsteps
+
+            # lines that terminated are done, the others were cut off at the end of the segment
+            # and resume from their final state and last sample
+            running = ~terminated
+            active = active[running]
+            state = {f: final_state[f][running] for f in CARRIED_STATE_FIELDS}
+            initial_input = samples[running, -1]
+
+        return [np.concatenate(s, axis=0) if s else np.zeros([0, 3]) for s in segments]
+
+    def _run_segment(self, state, initial_input, chars, chars_len, biases, tsteps):
+        """
+        One free run of at most tsteps steps on the engine.  Returns the samples
+        [len(chars), steps, 3], the final state as {field: [len(chars), size]} and a
+        [len(chars)] mask of the lines that terminated within the segment.
+        """
+        if self.engine is not None:
+            return self.engine.free_run(state, initial_input, chars, chars_len, biases, tsteps)
+
+        feed_dict = {getattr(self.nn.sample_state, f): state[f] for f in CARRIED_STATE_FIELDS}
+        feed_dict.update({
+            self.nn.num_samples: len(chars),
+            self.nn.sample_tsteps: tsteps,
+            self.nn.c: chars,
+            self.nn.c_len: chars_len,
+            self.nn.bias: biases
+        })
+        if initial_input is not None:
+            feed_dict[self.nn.sample_input] = initial_input
+
+        fetches = [self.nn.sampled_from_state, self.nn.sampled_terminated]
+        fetches += [getattr(self.nn.sampled_final_state, f) for f in CARRIED_STATE_FIELDS]
+        samples, terminated, *final_state = self.nn.session.run(fetches, feed_dict=feed_dict)
+        return samples, dict(zip(CARRIED_STATE_FIELDS, final_state)), terminated
+
+    def _primed_states(self, styles):
+        """
+        Returns the primed state for each line's style as {field: [len(styles), size]},
+        priming (in a single batch) only the styles that are not cached yet.
+        """
+        with self.lock:
+            states = {style: self.prime_cache.get(style) for style in set(styles)}
+            missing = sorted(style for style, state in states.items() if state is None)
+            if missing:
+                # an approximation: priming attends over the style's transcription and its trailing space
+                # only, where it used to see the line's first characters after them, so phi and kappa can
+                # differ slightly over the last prime steps.  Those characters only get real weight in the
+                # window once kappa reaches the end of the transcription, and the free run re-attends over the full line before
+                # its first step, so one cached state serves every line of the style
+                chars, chars_len = self._encode_chars(
+                    [""] * len(missing), prefixes=[self.style_bank.prefix(style) for style in missing]
+                )
+                primed = self._prime(missing, chars, chars_len)
+                for i, style in enumerate(missing):
+                    states[style] = {f: primed[f][i] for f in CARRIED_STATE_FIELDS}
+                    self.prime_cache.put(style, states[style])
+        return {f: np.stack([states[style][f] for style in styles]) for f in CARRIED_STATE_FIELDS}
+
+    def _prime(self, styles, chars, chars_len):
+        """
+        Runs the model over the stroke sequence of each style while attending over chars.
+        Returns the carried state fields as {field: [len(styles), size]}.
+        """
+        x_prime = np.zeros([len(styles), 1200, 3])
+        x_prime_len = np.zeros([len(styles)])
+        for i, style in enumerate(styles):
+            x_p = self.style_bank.strokes(style)
+            x_prime[i, :len(x_p)] = x_p
+            x_prime_len[i] = len(x_p)
+
+        if self.engine is not None:
+            with self.lock:
+                return self.engine.prime(x_prime, x_prime_len, chars, chars_len)
+
+        fetches = [getattr(self.nn.primed_state, f) for f in CARRIED_STATE_FIELDS]
+        with self.lock:
+            values = self.nn.session.run(
+                fetches,
+                feed_dict={
+                    self.nn.x_prime: x_prime,
+                    self.nn.x_prime_len: x_prime_len,
+                    self.nn.num_samples: len(styles),
+                    self.nn.c: chars,
+                    self.nn.c_len: chars_len,
+                }
+            )
+        return dict(zip(CARRIED_STATE_FIELDS, values))
+
+    def _encode_chars(self, texts, prefixes=None):
+        """
+        Encodes texts into a zero-padded [len(texts), 120] batch.  prefixes are optional already
+        encoded sequences (see StyleBank.prefix) put in front of each text.
+        """
+        chars = np.zeros([len(texts), 120])
+        chars_len = np.zeros([len(texts)])
+        for i, text in enumerate(texts):
+            encoded = drawing.encode_ascii(text)
+            if prefixes is not None:
+                encoded = np.concatenate([prefixes[i], encoded])
+            if len(encoded) > 120: encoded = encoded[:120]
+            chars[i, :len(encoded)] = encoded
+            chars_len[i] = len(encoded)
+        return chars, chars_len
+
+    @staticmethod
+    def _layout(strokes, lines, width, height, margins, ruled, line_gap, scale):
+        """
+        Places one page of sampled strokes on the ruled paper.  Returns (rules, paths): rules are
+        ((x1, y1), (x2, y2), color, stroke_width) lines and paths are (x, y, eos) arrays, both in
+        page coordinates with y pointing down.  Shared by the SVG and PDF renderers.
+        """
         LEFT, RIGHT = margins["left"], width - margins["right"]
         TOP, BOTTOM = margins["top"], height - margins["bottom"]
         
@@ -163,77 +436,84 @@ class Hand(object):
         # Increased from 1.15 to 1.30 to widen gaps between words
         DEFAULT_X_STRETCH = 1.30
 
-        dwg = svgwrite.Drawing(filename, size=(width, height), viewBox=f"0 0 {width} {height}")
-        dwg.add(dwg.rect(insert=(0, 0), size=(width, height), fill="white"))
+        rules = []
 
         if ruled:
             # Vertical Margins
-            dwg.add(dwg.line(start=(LEFT-20, 0), end=(LEFT-20, height), stroke="#DBDBDB", stroke_width=2))
-            dwg.add(dwg.line(start=(RIGHT+20, 0), end=(RIGHT+20, height), stroke="#DBDBDB", stroke_width=2))
+            rules.append(((LEFT-20, 0), (LEFT-20, height), "#DBDBDB", 2))
+            rules.append(((RIGHT+20, 0), (RIGHT+20, height), "#DBDBDB", 2))
             
             # === DOUBLE HEADER LINE ===
             # The first line (TOP) is drawn twice with a small gap (Double Red)
-            dwg.add(dwg.line(start=(0, TOP), end=(width, TOP), stroke="#FFB0B0", stroke_width=2))
-            dwg.add(dwg.line(start=(0, TOP + 6), end=(width, TOP + 6), stroke="#FFB0B0", stroke_width=2))
+            rules.append(((0, TOP), (width, TOP), "#FFB0B0", 2))
+            rules.append(((0, TOP + 6), (width, TOP + 6), "#FFB0B0", 2))
             
             # The rest of the lines (Blue)
             y = TOP + line_gap
             while y < height - margins["bottom"] + 10: # +10 ensures we get the last line
-                dwg.add(dwg.line(start=(0, y), end=(width, y), stroke="#AEC2D6", stroke_width=1))
+                rules.append(((0, y), (width, y), "#AEC2D6", 1))
                 y += line_gap
 
-        # Start writing on the first BLUE line (after the red header)
-        y_cursor = TOP + line_gap
-
-        for i, (offsets, text) in enumerate(zip(strokes, lines)):
-            if not text:
-                y_cursor += line_gap
-                continue
-
-            offsets = offsets.copy()
-            offsets[:, :2] *= scale
-            coords = drawing.offsets_to_coords(offsets)
-
-            if len(coords) == 0: 
-                y_cursor += line_gap; continue
-            try:
-                denoised = drawing.denoise(coords)
-                if len(denoised) > 2: coords = denoised
-            except: pass
-            try:
-                if len(coords) > 2: coords[:, :2] = drawing.align(coords[:, :2])
-            except: pass
-
-            coords[:, 1] *= -1
-            coords[:, 0] -= coords[:, 0].min()
-            
-            # === JUSTIFY & STRETCH ===
-            current_width = coords[:, 0].max()
-            is_last_line = (i == len(lines) - 1)
-            
-            projected_width = current_width * DEFAULT_X_STRETCH
-            fill_ratio = projected_width / WRITING_AREA_WIDTH
-            
-            # If line is > 65% full, stretch it to fill the line
-            if fill_ratio > 0.65 and not is_last_line:
-                final_stretch = WRITING_AREA_WIDTH / current_width
-                if final_stretch > 1.8: final_stretch = 1.8
-                coords[:, 0] *= final_stretch
-            else:
-                # Use default wide spacing
-                coords[:, 0] *= DEFAULT_X_STRETCH
-            # =========================
-            
-            coords[:, 0] += LEFT
-            coords[:, 1] += y_cursor + BASELINE_OFFSET
+        # the whole page is post-processed at once, as a zero-padded [lines, T, 3] batch
+        offsets, lengths = drawing.pad_strokes(strokes)
+        if not lengths.any():
+            # a page of blank lines pads to a zero-size batch, there is nothing to place on it
+            return rules, []
+        offsets[..., :2] *= scale
+        coords = drawing.offsets_to_coords(offsets)
+        coords = drawing.batch_denoise(coords, lengths)
+        coords = drawing.batch_align(coords, lengths)
+
+        mask = drawing.valid_mask(coords, lengths)
+        x, y = coords[..., 0], coords[..., 1]
+        y *= -1
+        x -= np.where(mask, x, np.inf).min(axis=1, keepdims=True)
+
+        # === JUSTIFY & STRETCH ===
+        current_width = np.where(mask, x, -np.inf).max(axis=1)
+        is_last_line = np.arange(len(lines)) == len(lines) - 1
+
+        projected_width = current_width * DEFAULT_X_STRETCH
+        fill_ratio = projected_width / WRITING_AREA_WIDTH
+
+        # If line is > 65% full, stretch it to fill the line (at most 1.8x),
+        # otherwise use default wide spacing
+        with np.errstate(divide='ignore', invalid='ignore'):
+            final_stretch = np.minimum(WRITING_AREA_WIDTH / current_width, 1.8)
+        stretch = np.where((fill_ratio > 0.65) & ~is_last_line, final_stretch, DEFAULT_X_STRETCH)
+        x *= stretch[:, None]
+        # =========================
+
+        # Start writing on the first BLUE line (after the red header), one ruled line per text line
+        y_cursor = TOP + line_gap * (1 + np.arange(len(lines)))
+        x += LEFT
+        y += (y_cursor + BASELINE_OFFSET)[:, None]
+
+        paths = [coords[i, :n] for i, (n, text) in enumerate(zip(lengths, lines)) if text and n]
+
+        return rules, paths
+
+    def _draw(
+        self, strokes, lines, filename, width, height, margins, ruled, line_gap, scale,
+        precision=1, relative=True
+    ):
+        """
+        Writes one page as SVG, or returns its markup when filename is None.  Stroke coordinates
+        are rounded to `precision` decimals and, with relative=True, written as relative path
+        commands (see drawing.svg_path).
+        """
+        rules, paths = self._layout(strokes, lines, width, height, margins, ruled, line_gap, scale)
+
+        dwg = svgwrite.Drawing(filename, size=(width, height), viewBox=f"0 0 {width} {height}")
+        dwg.add(dwg.rect(insert=(0, 0), size=(width, height), fill="white"))
 
-            path = ""
-            prev = 1.0
-            for x, y, eos in coords:
-                path += f"{'M' if prev else 'L'}{x},{y} "
-                prev = eos
+        for start, end, color, stroke_width in rules:
+            dwg.add(dwg.line(start=start, end=end, stroke=color, stroke_width=stroke_width))
 
-            dwg.add(svgwrite.path.Path(path).stroke("black", width=2.4, linecap="round").fill("none"))
-            y_cursor += line_gap
+        for coords in paths:
+            path = drawing.svg_path(coords, precision=precision, relative=relative)
+            dwg.add(svgwrite.path.Path(path).stroke("black", width=STROKE_WIDTH, linecap="round").fill("none"))
 
+        if filename is None:
+            return dwg.tostring()
         dwg.save()
\ No newline at end of file
@@ -3,8 +3,8 @@ from collections import defaultdict
 
 import matplotlib.pyplot as plt
 import numpy as np
-from scipy.signal import savgol_filter
-from scipy.interpolate import interp1d
+from scipy.signal import savgol_coeffs
+from scipy.interpolate import make_interp_spline
 
 
 alphabet = [
@@ -77,58 +77,126 @@ def encode_ascii(ascii_string):
     return np.array(list(map(lambda x: alpha_to_num[x], ascii_string)) + [0])
 
 
+def stroke_bounds(coords, breaks=()):
+    """
+    start and end indices of the strokes in coords, each stroke ending at a point with eos == 1
+    or right before one of the indices in breaks
+    """
+    splits = np.union1d(np.where(coords[:, 2] == 1)[0] + 1, breaks)
+    splits = np.concatenate([[0], splits, [len(coords)]]).astype(int)
+    starts, ends = splits[:-1], splits[1:]
+    keep = ends > starts
+    return starts[keep], ends[keep]
+
+
+def _smooth_strokes(coords, starts, ends):
+    # savgol_filter(stroke, 7, 3, mode='nearest') on every stroke at once: each point's window is
+    # clamped to its own stroke, which repeats the stroke's edge values like mode='nearest' does
+    lengths = ends - starts
+    first = np.repeat(starts, lengths)[:, None]
+    last = np.repeat(ends - 1, lengths)[:, None]
+    window = np.clip(np.arange(len(coords))[:, None] + np.arange(-3, 4), first, last)
+    return np.dot(coords[window, :2].transpose(0, 2, 1), savgol_coeffs(7, 3))
+
+
 def denoise(coords):
     """
     smoothing filter to mitigate some artifacts of the data collection
     """
-    coords = np.split(coords, np.where(coords[:, 2] == 1)[0] + 1, axis=0)
-    new_coords = []
-    for stroke in coords:
-        if len(stroke) != 0:
-            x_new = savgol_filter(stroke[:, 0], 7, 3, mode='nearest')
-            y_new = savgol_filter(stroke[:, 1], 7, 3, mode='nearest')
-            xy_coords = np.hstack([x_new.reshape(-1, 1), y_new.reshape(-1, 1)])
-            stroke = np.concatenate([xy_coords, stroke[:, 2].reshape(-1, 1)], axis=1)
-            new_coords.append(stroke)
-
-    coords = np.vstack(new_coords)
-    return coords
+    dtype = coords.dtype if coords.dtype in (np.float32, np.float64) else np.float64
+    xy = _smooth_strokes(coords, *stroke_bounds(coords))
+    return np.concatenate([xy, coords[:, 2:3]], axis=1).astype(dtype)
 
 
-def interpolate(coords, factor=2):
+def pad_strokes(strokes):
     """
-    interpolates strokes using cubic spline
+    stacks [n, 3] arrays of different lengths into a zero-padded [len(strokes), max n, 3] batch,
+    returns the batch and the lengths
     """
-    coords = np.split(coords, np.where(coords[:, 2] == 1)[0] + 1, axis=0)
-    new_coords = []
-    for stroke in coords:
-
-        if len(stroke) == 0:
-            continue
+    lengths = np.array([len(s) for s in strokes], dtype=int)
+    batch = np.zeros([len(strokes), max(lengths, default=0), 3])
+    if lengths.sum():
+        batch[valid_mask(batch, lengths)] = np.concatenate(strokes)
+    return batch, lengths
 
-        xy_coords = stroke[:, :2]
 
-        if len(stroke) > 3:
-            f_x = interp1d(np.arange(len(stroke)), stroke[:, 0], kind='cubic')
-            f_y = interp1d(np.arange(len(stroke)), stroke[:, 1], kind='cubic')
+def valid_mask(batch, lengths):
+    """
+    [lines, T] mask of the points of a padded batch that lie within each line's length
+    """
+    return np.arange(batch.shape[1]) < lengths[:, None]
 
-            xx = np.linspace(0, len(stroke) - 1, factor*(len(stroke)))
-            yy = np.linspace(0, len(stroke) - 1, factor*(len(stroke)))
 
-            x_new = f_x(xx)
-            y_new = f_y(yy)
+def batch_denoise(coords, lengths):
+    """
+    denoise applied to every line of a padded [lines, T, 3] batch, strokes end with their line.
+    lines of 2 points or fewer are left as they are.
+    """
+    mask = valid_mask(coords, lengths)
+    flat = coords[mask]
+    xy = _smooth_strokes(flat, *stroke_bounds(flat, breaks=np.cumsum(lengths)))
+
+    smooth = np.repeat(lengths > 2, lengths)
+    flat[smooth, :2] = xy[smooth]
+    coords = coords.copy()
+    coords[mask] = flat
+    return coords
 
-            xy_coords = np.hstack([x_new.reshape(-1, 1), y_new.reshape(-1, 1)])
 
-        stroke_eos = np.zeros([len(xy_coords), 1])
-        stroke_eos[-1] = 1.0
-        stroke = np.concatenate([xy_coords, stroke_eos], axis=1)
-        new_coords.append(stroke)
+def batch_align(coords, lengths):
+    """
+    align applied to every line (of more than 2 points) of a padded [lines, T, 3] batch, with the
+    least-squares slant and offset of all lines in closed form instead of one matrix inverse each
+    """
+    mask = valid_mask(coords, lengths)
+    n = np.maximum(lengths, 1)
+    x, y = coords[..., 0], coords[..., 1]
+
+    mean_x = np.sum(x * mask, axis=1) / n
+    mean_y = np.sum(y * mask, axis=1) / n
+    dx = (x - mean_x[:, None]) * mask
+    sxx = np.sum(dx * dx, axis=1)
+    sxy = np.sum(dx * (y - mean_y[:, None]), axis=1)
+
+    # lines that are too short or vertical (singular normal equations) are left untouched
+    fit = (lengths > 2) & (sxx > 0)
+    slope = np.where(fit, sxy / np.where(fit, sxx, 1.0), 0.0)
+    offset = np.where(fit, mean_y - slope * mean_x, 0.0)[:, None]
+    theta = np.arctan(slope)
+    cos, sin = np.cos(theta)[:, None], np.sin(theta)[:, None]
 
-    coords = np.vstack(new_coords)
+    coords = coords.copy()
+    coords[..., 0] = x * cos + y * sin - offset
+    coords[..., 1] = -x * sin + y * cos - offset
     return coords
 
 
+def interpolate(coords, factor=2):
+    """
+    interpolates strokes using cubic spline
+    """
+    starts, ends = stroke_bounds(coords)
+    lengths = ends - starts
+    # strokes longer than 3 points grow by factor, the others are kept as they are
+    new_lengths = np.where(lengths > 3, factor*lengths, lengths)
+    new_starts = np.concatenate([[0], np.cumsum(new_lengths)[:-1]]).astype(int)
+    new_coords = np.zeros([new_lengths.sum(), 3])
+    new_coords[new_starts + new_lengths - 1, 2] = 1.0
+
+    # strokes of equal length share their sample points, so one spline fits all of them at once
+    for n in np.unique(lengths):
+        group = np.flatnonzero(lengths == n)
+        xy = coords[starts[group, None] + np.arange(n), :2]
+
+        if n > 3:
+            spline = make_interp_spline(np.arange(n), xy.transpose(1, 0, 2).reshape(n, -1), k=3)
+            xy = spline(np.linspace(0, n - 1, factor*n)).reshape(factor*n, len(group), 2).transpose(1, 0, 2)
+
+        new_coords[new_starts[group, None] + np.arange(xy.shape[1]), :2] = xy
+
+    return new_coords
+
+
 def normalize(offsets):
     """
     normalizes strokes to median unit norm
@@ -149,9 +217,29 @@ def coords_to_offsets(coords):
 
 def offsets_to_coords(offsets):
     """
-    convert from offsets to coordinates
+    convert from offsets to coordinates, of one line or of a padded [lines, T, 3] batch
+    """
+    return np.concatenate([np.cumsum(offsets[..., :2], axis=-2), offsets[..., 2:3]], axis=-1)
+
+
+def svg_path(coords, precision=1, relative=False):
+    """
+    encodes (x, y, eos) coordinates as SVG path data, starting a new subpath after every eos.
+    coordinates are written with `precision` decimals, and with relative=True as offsets from the
+    previous (rounded) point, which keeps the numbers short.
     """
-    return np.concatenate([np.cumsum(offsets[:, :2], axis=0), offsets[:, 2:3]], axis=1)
+    if len(coords) == 0:
+        return ''
+
+    xy = np.round(coords[:, :2], precision)
+    starts = np.concatenate([[True], coords[:-1, 2] != 0])
+    if relative:
+        xy[1:] = np.round(np.diff(xy, axis=0), precision)
+
+    # points after a moveto are implicit linetos, so only subpath starts carry a command
+    number = '%.{}f,%.{}f'.format(precision, precision)
+    fmt = np.where(starts, ('m' if relative else 'M') + number, ' ' + number)
+    return ''.join(fmt) % tuple(xy.ravel())
 
 
 def draw(
@@ -12,31 +12,15 @@ TOP_MARGIN = 250
 BOTTOM_MARGIN = 250
 # =================================================
 
-def merge_to_pdf(svg_files, final_pdf_name):
-    if not svg_files: return
-    try:
-        from svglib.svglib import svg2rlg
-        from reportlab.graphics import renderPDF
-        from reportlab.pdfgen import canvas
-        
-        print("\n📚 Merging into PDF...")
-        c = canvas.Canvas(final_pdf_name, pagesize=(PAGE_WIDTH, PAGE_HEIGHT))
-        for svg_file in svg_files:
-            print(f"   Processing {svg_file}...")
-            drawing = svg2rlg(svg_file)
-            renderPDF.draw(drawing, c, 0, 0)
-            c.showPage()
-        c.save()
-        print(f"✅ FINAL PDF SAVED: {os.path.abspath(final_pdf_name)}")
-    except ImportError:
-        print("\n⚠️ PDF Error: Install libraries with 'pip install svglib reportlab'")
-
 def main():
     parser = argparse.ArgumentParser(description="Generate notebook-style handwritten text.")
     parser.add_argument("--text", type=str, help="Text to synthesize")
     parser.add_argument("--style", type=int, help="Handwriting style (0-12)")
     parser.add_argument("--bias", type=float, help="Bias (0.5–1.0)")
     parser.add_argument("--output", type=str, default="notebook.svg", help="Output filename")
+    parser.add_argument("--backend", choices=["svg", "pdf"], default="svg",
+                        help="svg: write one SVG per page and merge them into the PDF, "
+                             "pdf: draw strokes straight into the PDF without SVG files (faster)")
 
     args = parser.parse_args()
 
@@ -84,24 +68,55 @@ def main():
 
     hand = Hand()
 
-    generated_svgs = hand.write(
+    margins = {
+        "left": LEFT_MARGIN,
+        "right": RIGHT_MARGIN,
+        "top": TOP_MARGIN,
+        "bottom": BOTTOM_MARGIN
+    }
+    pdf_name = args.output.replace(".svg", ".pdf")
+
+    if args.backend == "pdf":
+        try:
+            hand.write(
+                filename=pdf_name,
+                lines=text,
+                biases=[bias],
+                styles=[style],
+                page_width=PAGE_WIDTH,
+                page_height=PAGE_HEIGHT,
+                margins=margins,
+                ruled=True,
+                backend="pdf"
+            )
+            print(f"✅ FINAL PDF SAVED: {os.path.abspath(pdf_name)}")
+        except ImportError:
+            print("\n⚠️ PDF Error: Install reportlab with 'pip install reportlab'")
+        return
+
+    # pages are appended to the PDF as soon as they are drawn, while the next one is sampled
+    try:
+        from pdf_export import SvgPdfWriter
+        pdf = SvgPdfWriter(pdf_name, pagesize=(PAGE_WIDTH, PAGE_HEIGHT))
+    except ImportError:
+        print("\n⚠️ PDF Error: Install libraries with 'pip install svglib reportlab'")
+        pdf = None
+
+    hand.write(
         filename=args.output,
         lines=text, 
         biases=[bias],
         styles=[style],
         page_width=PAGE_WIDTH,
         page_height=PAGE_HEIGHT,
-        margins={
-            "left": LEFT_MARGIN,
-            "right": RIGHT_MARGIN,
-            "top": TOP_MARGIN,
-            "bottom": BOTTOM_MARGIN
-        },
-        ruled=True
+        margins=margins,
+        ruled=True,
+        on_page=pdf.add_page if pdf else None
     )
 
-    pdf_name = args.output.replace(".svg", ".pdf")
-    merge_to_pdf(generated_svgs, pdf_name)
+    if pdf:
+        pdf.save()
+        print(f"✅ FINAL PDF SAVED: {os.path.abspath(pdf_name)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
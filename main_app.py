@@ -1,3 +1,4 @@
+import importlib.util
 import os
 import sys
 import time
@@ -10,14 +11,10 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 # 2. IMPORT HANDWRITING MODULES
 try:
     from demo import Hand
-    try:
-        from svglib.svglib import svg2rlg
-        from reportlab.graphics import renderPDF
-        from reportlab.pdfgen import canvas
-        PDF_AVAILABLE = True
-    except ImportError:
-        PDF_AVAILABLE = False
-        print("⚠️  PDF libraries missing. Install with: pip install svglib reportlab")
+    # Hand.write(backend="pdf") imports pdf_export itself, only check that reportlab is there
+    PDF_AVAILABLE = importlib.util.find_spec("reportlab") is not None
+    if not PDF_AVAILABLE:
+        print("⚠️  PDF libraries missing. Install with: pip install reportlab")
     
     HANDWRITING_AVAILABLE = True
 except ImportError as e:
@@ -26,28 +23,7 @@ except ImportError as e:
     HANDWRITING_AVAILABLE = False
 
 # ==========================================
-# 3. HELPER FUNCTION: MERGE TO PDF
-# ==========================================
-def save_response_as_pdf(svg_files, output_filename):
-    if not PDF_AVAILABLE or not svg_files:
-        return
-    
-    try:
-        c = canvas.Canvas(output_filename, pagesize=(1860, 3508)) 
-        for svg_file in svg_files:
-            drawing = svg2rlg(svg_file)
-            renderPDF.draw(drawing, c, 0, 0)
-            c.showPage()
-            try: os.remove(svg_file) 
-            except: pass
-            
-        c.save()
-        print(f"📄 Saved as PDF: {os.path.abspath(output_filename)}")
-    except Exception as e:
-        print(f"❌ Error saving PDF: {e}")
-
-# ==========================================
-# 4. MAIN APPLICATION
+# 3. MAIN APPLICATION
 # ==========================================
 class HandwritingBot:
     def __init__(self):
@@ -72,18 +48,29 @@ class HandwritingBot:
         filename_base = f"output_style{style_id}_{timestamp}.svg"
         pdf_filename = f"output_style{style_id}_{timestamp}.pdf"
 
-        # Pass the selected style_id to the writer
-        generated_svgs = self.hand_model.write(
-            filename=filename_base,
-            lines=text,
-            biases=[0.75],       # Standard neatness
-            styles=[style_id],   # USER SELECTED STYLE
-            page_width=1860,
-            page_height=3508,
-            ruled=True
-        )
-
-        save_response_as_pdf(generated_svgs, pdf_filename)
+        # Strokes are drawn straight into the PDF, no intermediate SVG pages
+        if PDF_AVAILABLE:
+            self.hand_model.write(
+                filename=pdf_filename,
+                lines=text,
+                biases=[0.75],       # Standard neatness
+                styles=[style_id],   # USER SELECTED STYLE
+                page_width=1860,
+                page_height=3508,
+                ruled=True,
+                backend="pdf"
+            )
+            print(f"📄 Saved as PDF: {os.path.abspath(pdf_filename)}")
+        else:
+            self.hand_model.write(
+                filename=filename_base,
+                lines=text,
+                biases=[0.75],
+                styles=[style_id],
+                page_width=1860,
+                page_height=3508,
+                ruled=True
+            )
 
     def get_user_style(self):
         """Asks the user for a style number 0-12"""
@@ -0,0 +1,254 @@
+"""
+NumPy implementation of the synthesis model for sampling without TensorFlow.
+
+Inference only needs the three LSTM layers, the gaussian attention window and the mixture density
+head of rnn_cell.LSTMAttentionCell, so the trained variables are exported once from a checkpoint
+to a .npz file and NumpyEngine runs the same step, priming and rnn_ops.rnn_free_run loop on them.
+
+Export the weights of the latest checkpoint (needs TensorFlow, once):
+
+    python numpy_engine.py --checkpoint checkpoints --output checkpoints/weights.npz
+
+and sample with demo.Hand(engine='numpy').
+"""
+import argparse
+import os
+
+import numpy as np
+
+from cell_state import CARRIED_STATE_FIELDS, LSTMAttentionCellState
+
+
+# .npz key -> checkpoint variable, the variables rnn.rnn.calculate_inference restores
+WEIGHT_NAMES = {
+    'lstm1_kernel': 'rnn/LSTMAttentionCell/lstm_cell/kernel',
+    'lstm1_bias': 'rnn/LSTMAttentionCell/lstm_cell/bias',
+    'attention_weights': 'rnn/LSTMAttentionCell/attention/weights',
+    'attention_biases': 'rnn/LSTMAttentionCell/attention/biases',
+    'lstm2_kernel': 'rnn/LSTMAttentionCell/lstm_cell_1/kernel',
+    'lstm2_bias': 'rnn/LSTMAttentionCell/lstm_cell_1/bias',
+    'lstm3_kernel': 'rnn/LSTMAttentionCell/lstm_cell_2/kernel',
+    'lstm3_bias': 'rnn/LSTMAttentionCell/lstm_cell_2/bias',
+    'gmm_weights': 'rnn/gmm/weights',
+    'gmm_biases': 'rnn/gmm/biases',
+}
+
+
+def export_weights(checkpoint, path):
+    """
+    Writes the synthesis model's variables from a TensorFlow checkpoint (a checkpoint prefix, or a
+    directory whose latest checkpoint is used) to the .npz file at path.  The checkpoint's name is
+    stored along with them.
+    """
+    import tensorflow.compat.v1 as tf
+
+    if os.path.isdir(checkpoint):
+        checkpoint = tf.train.latest_checkpoint(checkpoint)
+    reader = tf.train.load_checkpoint(checkpoint)
+    arrays = {key: reader.get_tensor(name).astype(np.float32) for key, name in WEIGHT_NAMES.items()}
+    np.savez(path, checkpoint=np.array(os.path.basename(checkpoint)), **arrays)
+    return checkpoint
+
+
+def _sigmoid(x):
+    return 0.5*(1.0 + np.tanh(0.5*x))
+
+
+def _lstm(inputs, c, h, kernel, bias):
+    # tf.nn.rnn_cell.LSTMCell: gates i, j, f, o in that order and forget_bias 1.0
+    i, j, f, o = np.split(np.concatenate([inputs, h], axis=1) @ kernel + bias, 4, axis=1)
+    c = _sigmoid(f + 1.0)*c + _sigmoid(i)*np.tanh(j)
+    return _sigmoid(o)*np.tanh(c), c
+
+
+class NumpyEngine(object):
+
+    """Samples from the synthesis model in NumPy, from weights written by export_weights.
+
+    States are {field: array} dicts with the fields of LSTMAttentionCellState, and the methods
+    mirror the TensorFlow graph: prime is rnn.prime_state, free_run is rnn.sample_from_state.
+
+    Args:
+        weights_path: .npz file written by export_weights.
+        attention_band: see rnn_cell.LSTMAttentionCell.
+        seed: Seed of the sampler's random generator.
+    """
+
+    def __init__(self, weights_path, attention_band=None, seed=None):
+        weights = np.load(weights_path)
+        self.weights = {key: weights[key] for key in WEIGHT_NAMES}
+        self.checkpoint = str(weights['checkpoint'])
+        self.attention_band = attention_band
+        self.rng = np.random.default_rng(seed)
+
+        self.lstm_size, output_units = self.weights['gmm_weights'].shape
+        self.num_output_mixture_components = (output_units - 1) // 6
+        self.num_attn_mixture_components = self.weights['attention_biases'].shape[0] // 3
+        self.window_size = self.weights['lstm1_kernel'].shape[0] - self.lstm_size - 3
+
+    @property
+    def state_sizes(self):
+        """Width of every carried state field."""
+        k = self.num_attn_mixture_components
+        return dict(zip(CARRIED_STATE_FIELDS, [self.lstm_size]*6 + [k]*3))
+
+    def attention_values(self, chars, chars_len):
+        """One-hot [batch_size, char_len, window_size] encoding of chars, zero past chars_len."""
+        chars = np.asarray(chars, dtype=int)
+        mask = np.arange(chars.shape[1]) < np.asarray(chars_len)[:, None]
+        return (np.eye(self.window_size, dtype=np.float32)[chars]*mask[:, :, None]).astype(np.float32)
+
+    def zero_state(self, batch_size, char_len):
+        sizes = dict(self.state_sizes, w=self.window_size, phi=char_len)
+        return {f: np.zeros([batch_size, sizes[f]], dtype=np.float32) for f in LSTMAttentionCellState._fields}
+
+    def attention_window(self, alpha, beta, kappa, values):
+        """LSTMAttentionCell.attention_window, returns w and phi."""
+        char_len = values.shape[1]
+        if self.attention_band is None:
+            u = np.arange(char_len, dtype=np.float32)
+            phi = np.sum(alpha[:, :, None]*np.exp(-np.square(kappa[:, :, None] - u) / beta[:, :, None]), axis=1)
+            return np.einsum('bl,blv->bv', phi, values), phi
+
+        band = min(self.attention_band, char_len)
+        center = np.sum(alpha*kappa, axis=1) / np.maximum(np.sum(alpha, axis=1), 1e-8)
+        start = np.clip(np.round(center).astype(int) - band // 2, 0, char_len - band)
+        positions = start[:, None] + np.arange(band)
+        u = positions[:, None, :].astype(np.float32)
+        phi_band = np.sum(alpha[:, :, None]*np.exp(-np.square(kappa[:, :, None] - u) / beta[:, :, None]), axis=1)
+
+        rows = np.arange(len(values))[:, None]
+        w = np.einsum('bn,bnv->bv', phi_band, values[rows, positions])
+        phi = np.zeros([len(values), char_len], dtype=np.float32)
+        phi[rows, positions] = phi_band
+        return w, phi
+
+    def attend(self, state, values):
+        """LSTMAttentionCell.attend, the state with w and phi recomputed against values."""
+        w, phi = self.attention_window(state['alpha'], np.maximum(state['beta'], .01), state['kappa'], values)
+        return dict(state, w=w, phi=phi)
+
+    def step(self, inputs, state, values):
+        """LSTMAttentionCell.__call__, returns the next state (its h3 is the cell output)."""
+        p = self.weights
+        h1, c1 = _lstm(np.concatenate([state['w'], inputs], axis=1), state['c1'], state['h1'],
+                       p['lstm1_kernel'], p['lstm1_bias'])
+
+        attention_inputs = np.concatenate([state['w'], inputs, h1], axis=1)
+        attention_params = np.logaddexp(0.0, attention_inputs @ p['attention_weights'] + p['attention_biases'])
+        alpha, beta, kappa = np.split(attention_params, 3, axis=1)
+        kappa = state['kappa'] + kappa / 25.0
+        beta = np.maximum(beta, .01)
+        w, phi = self.attention_window(alpha, beta, kappa, values)
+
+        h2, c2 = _lstm(np.concatenate([inputs, h1, w], axis=1), state['c2'], state['h2'],
+                       p['lstm2_kernel'], p['lstm2_bias'])
+        h3, c3 = _lstm(np.concatenate([inputs, h2, w], axis=1), state['c3'], state['h3'],
+                       p['lstm3_kernel'], p['lstm3_bias'])
+        return dict(h1=h1, c1=c1, h2=h2, c2=c2, h3=h3, c3=c3, alpha=alpha, beta=beta, kappa=kappa, w=w, phi=phi)
+
+    def output_parameters(self, h3, bias, eps=1e-8, sigma_eps=1e-4):
+        """LSTMAttentionCell._parse_parameters of the gmm layer at h3: pis, mus, sigmas, rhos, es."""
+        k = self.num_output_mixture_components
+        params = h3 @ self.weights['gmm_weights'] + self.weights['gmm_biases']
+        pis, sigmas, rhos, mus, es = np.split(params, np.cumsum([k, 2*k, k, 2*k]), axis=1)
+        pis = pis*(1 + bias[:, None])
+        sigmas = sigmas - bias[:, None]
+
+        pis = np.exp(pis - pis.max(axis=1, keepdims=True))
+        pis /= pis.sum(axis=1, keepdims=True)
+        pis = np.where(pis < .01, 0.0, pis)
+        sigmas = np.maximum(np.exp(sigmas), sigma_eps)
+        rhos = np.clip(np.tanh(rhos), eps - 1.0, 1.0 - eps)
+        es = np.clip(_sigmoid(es), eps, 1.0 - eps)
+        es = np.where(es < .01, 0.0, es)
+        return pis, mus, sigmas, rhos, es
+
+    def sample_output(self, h3, bias):
+        """rnn_cell.sample_output_mixture with this engine's random generator."""
+        pis, mus, sigmas, rhos, es = self.output_parameters(h3, bias)
+        k = self.num_output_mixture_components
+        cdf = np.cumsum(pis, axis=1)
+        u = self.rng.random([len(h3), 1])*cdf[:, -1:]
+        idx = np.minimum(np.sum(u >= cdf, axis=1), k - 1)
+
+        rows = np.arange(len(h3))
+        mu1, mu2 = mus[rows, idx], mus[rows, k + idx]
+        sigma1, sigma2 = sigmas[rows, idx], sigmas[rows, k + idx]
+        rho = rhos[rows, idx]
+        z1, z2 = self.rng.standard_normal([2, len(h3)])
+        x = mu1 + sigma1*z1
+        y = mu2 + sigma2*(rho*z1 + np.sqrt(1.0 - np.square(rho))*z2)
+        e = self.rng.random(len(h3)) < es[:, 0]
+        return np.stack([x, y, e], axis=1).astype(np.float32)
+
+    def terminated(self, state, output, chars_len):
+        """LSTMAttentionCell.termination_condition."""
+        char_idx = np.argmax(state['phi'], axis=1)
+        final_char = char_idx >= chars_len - 1
+        past_final_char = char_idx >= chars_len
+        return (final_char & (output[:, 2] == 1)) | past_final_char
+
+    def prime(self, x_prime, x_prime_len, chars, chars_len):
+        """
+        rnn.prime_state: runs the model over the stroke sequences x_prime from the zero state while
+        attending over chars.  Returns the carried state fields as {field: [batch_size, size]}.
+        """
+        values = self.attention_values(chars, chars_len)
+        x_prime = np.asarray(x_prime, dtype=np.float32)
+        x_prime_len = np.asarray(x_prime_len, dtype=int)
+        state = self.zero_state(len(x_prime), values.shape[1])
+        # like dynamic_rnn, each sequence's state stops changing after its last step
+        for t in range(x_prime_len.max(initial=0)):
+            running = (t < x_prime_len)[:, None]
+            new_state = self.step(x_prime[:, t], state, values)
+            state = {f: np.where(running, new_state[f], state[f]) for f in state}
+        return {f: state[f] for f in CARRIED_STATE_FIELDS}
+
+    def free_run(self, state, initial_input, chars, chars_len, biases, tsteps):
+        """
+        rnn.sample_from_state: samples at most tsteps points per line from the carried state
+        fields, feeding every point back as the next input like rnn_ops.rnn_free_run.  If
+        initial_input is None the first input is sampled from the state.  Returns the samples as
+        [batch_size, steps, 3] (lines that finished emit zeros), the final carried state and which
+        lines terminated rather than being cut off at tsteps.
+
+        Unlike the graph, which steps every line until the whole batch has finished, only the
+        lines still running are stepped.
+        """
+        values = self.attention_values(chars, chars_len)
+        chars_len = np.asarray(chars_len, dtype=int)
+        biases = np.asarray(biases, dtype=np.float32)
+        state = self.attend({f: np.array(state[f], dtype=np.float32) for f in CARRIED_STATE_FIELDS}, values)
+        if initial_input is None:
+            initial_input = self.sample_output(state['h3'], biases)
+        inputs = np.array(initial_input, dtype=np.float32)
+
+        terminated = self.terminated(state, inputs, chars_len)
+        finished = terminated | (tsteps <= 0)
+        outputs = []
+        while not finished.all():
+            running = np.flatnonzero(~finished)
+            new_state = self.step(inputs[running], {f: v[running] for f, v in state.items()}, values[running])
+            output = self.sample_output(new_state['h3'], biases[running])
+            terminated[running] = self.terminated(new_state, output, chars_len[running])
+            finished[running] = (len(outputs) + 1 >= tsteps) | terminated[running]
+
+            # like rnn_free_run, the step that terminates the last line emits zeros for every line
+            inputs = np.zeros_like(inputs)
+            if not terminated.all():
+                inputs[running] = output
+            outputs.append(inputs)
+            for f, v in new_state.items():
+                state[f][running] = v
+
+        samples = np.stack(outputs, axis=1) if outputs else np.zeros([len(inputs), 0, 3], dtype=np.float32)
+        return samples, {f: state[f] for f in CARRIED_STATE_FIELDS}, terminated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the synthesis model weights for NumpyEngine.')
+    parser.add_argument('--checkpoint', default='checkpoints', help='checkpoint prefix or directory')
+    parser.add_argument('--output', default=os.path.join('checkpoints', 'weights.npz'))
+    args = parser.parse_args()
+    print('exported {} to {}'.format(export_weights(args.checkpoint, args.output), args.output))
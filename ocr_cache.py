@@ -0,0 +1,85 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+class OcrCache(object):
+
+    """Persistent LRU cache of OCR results, keyed on image content.
+
+    Keys are the sha256 of an image's pixels together with everything else that changes the
+    result (model, decoding settings), so re-uploading the same document or pressing "Extract Text"
+    again is answered without running TrOCR.  Entries live in one SQLite table; once it holds more
+    than max_entries rows, the least recently used ones are evicted.
+
+    Args:
+        path: SQLite database file, ':memory:' keeps the cache for this process only.
+        max_entries: Maximum number of cached pages and lines together.
+    """
+
+    def __init__(self, path='ocr_cache.sqlite3', max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Streamlit serves sessions from several threads, they share the connection under the lock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, text TEXT NOT NULL, used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+        self._db.commit()
+
+    @staticmethod
+    def key(image, *settings):
+        """Key of a PIL image's pixels under the given settings (model id, decoding options, ...)."""
+        digest = hashlib.sha256()
+        digest.update('{}|{}|{}'.format(image.mode, image.size, '|'.join(map(str, settings))).encode('utf-8'))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute('SELECT text FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, key, text):
+        self.put_many([(key, text)])
+
+    def put_many(self, items):
+        with self._lock:
+            now = time.time()
+            self._db.executemany(
+                'INSERT OR REPLACE INTO results (key, text, used) VALUES (?, ?, ?)',
+                [(key, text, now) for key, text in items]
+            )
+            excess = self._count() - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    'DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)', (excess,)
+                )
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM results')
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        return self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
@@ -1,11 +1,17 @@
 import sys
+import io
 import os
+import queue
+import threading
+import time
 import warnings
 import logging
 import numpy as np
 import re
+from collections import namedtuple
 from PIL import Image, ImageOps, ImageEnhance
 import streamlit as st # Added Streamlit for caching
+import torch
 
 # Import PDF support
 try:
@@ -19,17 +25,45 @@ logging.getLogger("transformers").setLevel(logging.ERROR)
 
 from transformers import TrOCRProcessor, VisionEncoderDecoderModel
 
+from ocr_cache import OcrCache
+
 # === CONFIGURATION ===
 LOCAL_MODEL_DIR = "trocr_model_large"
 HF_MODEL_ID = "microsoft/trocr-large-handwritten"
+OCR_CACHE_PATH = "ocr_cache.sqlite3"
+# CPU inference settings, see load_model
+OCR_PRECISION = os.environ.get("OCR_PRECISION", "fp32")
+OCR_THREADS = int(os.environ.get("OCR_THREADS", "0"))
+
+# decoding budget of a crop: MIN_NEW_TOKENS + TOKENS_PER_ASPECT * ink width / line height.
+# A handwritten character is roughly a quarter of the line height wide and a BPE token covers
+# about three characters, so this leaves ample headroom over the expected token count.
+MIN_NEW_TOKENS = 8
+TOKENS_PER_ASPECT = 2.0
+
+# One crop to recognise: the prepared image and how many tokens it may decode at most
+LineCrop = namedtuple("LineCrop", ["image", "budget"])
+# One recognised page, as yielded by iter_document; seconds is the time spent on this page
+PageResult = namedtuple("PageResult", ["page_num", "num_pages", "text", "seconds"])
 
 @st.cache_resource # This keeps the model in memory so it doesn't reload on every click
-def load_model():
+def load_model(precision=OCR_PRECISION, num_threads=OCR_THREADS, num_beams=1):
     """
     Loads the TrOCR model. 
     Prioritizes local folder if it exists (faster), 
     otherwise downloads from HuggingFace (for GitHub/Cloud deployment).
+
+    precision: 'fp32', 'int8' (dynamic int8 quantisation of every Linear layer) or 'bf16'.
+        Run `python benchmark.py ocr_precision` to see what each costs in accuracy.
+    num_threads: torch intra-op threads, 0 keeps torch's default (one per core).
+    num_beams: 1 decodes greedily, more runs beam search (slower, sometimes more accurate).
+        process_single_image can override it per call.
     """
+    if precision not in ("fp32", "int8", "bf16"):
+        raise ValueError(f"precision must be 'fp32', 'int8' or 'bf16', got {precision!r}")
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
     path_to_use = HF_MODEL_ID # Default to online
     
     if os.path.exists(LOCAL_MODEL_DIR):
@@ -40,13 +74,69 @@ def load_model():
 
     try:
         processor = TrOCRProcessor.from_pretrained(path_to_use)
-        model = VisionEncoderDecoderModel.from_pretrained(path_to_use)
-        print("✅ Model loaded successfully!")
+        model = VisionEncoderDecoderModel.from_pretrained(path_to_use).eval()
+        if precision == "int8":
+            torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        elif precision == "bf16":
+            model = model.to(torch.bfloat16)
+        model.ocr_precision = precision
+        model.generation_config.num_beams = num_beams
+        model.generation_config.early_stopping = num_beams > 1
+        print(f"✅ Model loaded successfully! ({precision})")
         return processor, model
     except Exception as e:
         print(f"❌ Error loading model: {e}")
         return None, None
 
+@st.cache_resource
+def load_cache():
+    """The OCR result cache shared by every session, see ocr_cache.OcrCache."""
+    return OcrCache(OCR_CACHE_PATH)
+
+def decode_settings(model, max_new_tokens=100, num_beams=None):
+    """Everything besides the pixels (and the crop's budget) that a cached result depends on."""
+    if num_beams is None:
+        num_beams = model.generation_config.num_beams
+    return (
+        getattr(model, "name_or_path", ""),
+        getattr(model, "ocr_precision", "fp32"),
+        f"max_new_tokens={max_new_tokens}",
+        f"num_beams={num_beams}",
+    )
+
+def token_budget(box, max_new_tokens=100):
+    """Most tokens worth decoding for a crop of the given (x1, y1, x2, y2) ink box."""
+    x1, y1, x2, y2 = box
+    aspect = (x2 - x1) / max(1, y2 - y1)
+    return min(max_new_tokens, MIN_NEW_TOKENS + int(np.ceil(TOKENS_PER_ASPECT * aspect)))
+
+class DecodeStats(object):
+    """
+    Token counts of every line decoded by recognize_lines: its budget, the tokens it produced
+    before stopping and the decode steps its batch ran.  Steps beyond a line's own tokens were
+    spent waiting for longer lines of the same batch.
+    """
+
+    def __init__(self):
+        self.budgets = []
+        self.tokens = []
+        self.steps = []
+
+    def add(self, budget, tokens, steps):
+        self.budgets.append(budget)
+        self.tokens.append(tokens)
+        self.steps.append(steps)
+
+    def summary(self):
+        lines = len(self.tokens)
+        return {
+            "lines": lines,
+            "mean_budget": float(np.mean(self.budgets)) if lines else 0.0,
+            "mean_tokens": float(np.mean(self.tokens)) if lines else 0.0,
+            "mean_steps": float(np.mean(self.steps)) if lines else 0.0,
+            "wasted_steps": 1.0 - sum(self.tokens) / max(1, sum(self.steps)),
+        }
+
 def clean_line_text(text):
     if "Categories" in text or "Living people" in text: return ""
     text = re.sub(r'^[\d\W_]{1,5}\s+', '', text)
@@ -95,73 +185,329 @@ def reconstruct_paragraph(text_lines):
     full_text = smart_polish_text(full_text)
     return full_text
 
-def remove_lines_and_find_text(image, page_num=0):
+def ink_mask(image):
+    """Boolean ink mask of a page, with ruled lines and margin rules erased."""
     gray = image.convert("L")
-    w, h = gray.size
-    crop_box = (0, 0, w, h)
-    gray = gray.crop(crop_box)
     
-    np_gray = np.array(gray)
+    np_gray = np.asarray(gray)
     threshold = np.mean(np_gray) - 25 
-    binary = (np_gray < threshold).astype(int)
+    binary = np_gray < threshold
 
     # === GRID ERASER ===
+    # both sums are taken before either kind of rule is erased
     b_h, b_w = binary.shape
-    col_sums = np.sum(binary, axis=0)
-    row_sums = np.sum(binary, axis=1)
+    col_sums = np.count_nonzero(binary, axis=0)
+    row_sums = np.count_nonzero(binary, axis=1)
     
-    is_vert_line = col_sums > b_h * 0.50
-    if np.any(is_vert_line): binary[:, is_vert_line] = 0
-        
-    is_horz_line = row_sums > b_w * 0.50
-    if np.any(is_horz_line): binary[is_horz_line, :] = 0
+    binary[:, col_sums > b_h * 0.50] = False
+    binary[row_sums > b_w * 0.50, :] = False
     # ===================
+    return binary
+
+def remove_lines_and_find_text(image, page_num=0):
+    return find_text_bands(ink_mask(image))
 
-    row_sums = np.sum(binary, axis=1)
-    has_ink = row_sums > 5 
+def find_text_bands(binary):
+    """(y1, y2) of every text line in an ink mask, top to bottom."""
+    h = binary.shape[0]
+    has_ink = np.count_nonzero(binary, axis=1) > 5 
     
-    lines = []
-    start_y = None
-    
-    for y, is_ink in enumerate(has_ink):
-        if is_ink and start_y is None:
-            start_y = y
-        elif not is_ink and start_y is not None:
-            end_y = y
-            height = end_y - start_y
-            if height > 8: 
-                pad = 4    
-                lines.append((max(0, start_y - pad), min(h, end_y + pad)))
-            start_y = None
-            
-    if start_y is not None:
-        lines.append((start_y, len(has_ink)))
+    # band edges: +1 where ink starts, -1 on the first row after it ends
+    edges = np.diff(np.concatenate([[0], has_ink.view(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    
+    # a band still open at the bottom of the page is kept as is, without padding
+    trailing = None
+    if len(ends) and ends[-1] == len(has_ink):
+        trailing = (int(starts[-1]), len(has_ink))
+        starts, ends = starts[:-1], ends[:-1]
+    
+    keep = ends - starts > 8
+    pad = 4
+    lines = list(zip(
+        np.maximum(0, starts[keep] - pad).tolist(),
+        np.minimum(h, ends[keep] + pad).tolist()
+    ))
+    if trailing is not None:
+        lines.append(trailing)
             
     return lines
 
-def process_single_image(image, processor, model, page_num=1):
+def find_line_boxes(image, page_num=0, max_aspect=16):
+    """
+    Like remove_lines_and_find_text, but trims every line to the columns that hold ink, so the
+    crops fed to TrOCR skip the empty margins.  Lines wider than max_aspect times their height are
+    split at the widest word gaps into several chunks, TrOCR squeezes every crop to a square.
+    Returns one list of (x1, y1, x2, y2) boxes per line, left to right.
+    """
+    binary = ink_mask(image)
+    w = binary.shape[1]
+    pad = 10
+    
+    lines = []
+    for y1, y2 in find_text_bands(binary):
+        has_ink = binary[y1:y2].any(axis=0)
+        ink_x = np.flatnonzero(has_ink)
+        if len(ink_x) == 0:
+            x1, x2 = 0, w
+        else:
+            x1, x2 = max(0, int(ink_x[0]) - pad), min(w, int(ink_x[-1]) + 1 + pad)
+        
+        chunks = split_at_gaps(has_ink, x1, x2, max_aspect * (y2 - y1), min_gap=max(4, (y2 - y1) // 4))
+        lines.append([(cx1, y1, cx2, y2) for cx1, cx2 in chunks])
+    return lines
+
+def split_at_gaps(has_ink, x1, x2, max_width, min_gap):
+    """Cuts [x1, x2) into chunks no wider than max_width where possible, only at blank gaps."""
+    ink_x = np.flatnonzero(has_ink[x1:x2])
+    if x2 - x1 <= max_width or len(ink_x) == 0:
+        return [(x1, x2)]
+    
+    # cut points: the middle of every run of at least min_gap blank columns between the first and
+    # the last ink column, the padding around the ink is not a gap between words
+    first, last = x1 + int(ink_x[0]), x1 + int(ink_x[-1]) + 1
+    edges = np.diff(np.concatenate([[0], (~has_ink[first:last]).view(np.int8), [0]]))
+    gap_starts = np.flatnonzero(edges == 1)
+    gap_ends = np.flatnonzero(edges == -1)
+    wide = gap_ends - gap_starts >= min_gap
+    cuts = (first + (gap_starts[wide] + gap_ends[wide]) // 2).tolist()
+    
+    chunks = []
+    start, prev = x1, None
+    for cut in cuts + [x2]:
+        if cut - start > max_width and prev is not None and prev > start:
+            chunks.append((start, prev))
+            start = prev
+        prev = cut
+    chunks.append((start, x2))
+    # TrOCR makes up text for a crop of blank paper
+    return [(cx1, cx2) for cx1, cx2 in chunks if has_ink[cx1:cx2].any()]
+
+def prepare_line_image(image, box):
+    """Crops one text line (or chunk of one) out of the page and cleans it up for TrOCR."""
+    line_img = image.crop(box)
+    
+    if line_img.width < 1000:
+        new_w = line_img.width * 2
+        new_h = line_img.height * 2
+        line_img = line_img.resize((new_w, new_h), Image.Resampling.LANCZOS)
+    
+    line_img = ImageOps.expand(line_img, border=10, fill='white')
+    line_img = ImageOps.autocontrast(line_img.convert("L"), cutoff=1)
+    return line_img.convert("RGB")
+
+def recognize_lines(
+    line_images, processor, model, batch_size=8, max_new_tokens=100, cache=None,
+    budgets=None, num_beams=None, stats=None
+):
+    """
+    Runs TrOCR over the line crops `batch_size` at a time and returns their texts in order.
+    The processor resizes every crop to the encoder's fixed input size, so a batch needs no
+    extra padding; generate() pads the decoded sequences itself.
+    With a cache (ocr_cache.OcrCache), only crops that were never recognised before are decoded.
+
+    budgets: per-crop token limits (see token_budget), max_new_tokens when not given.  Crops are
+        batched in order of budget, so a short line is not held up by a long one and every batch
+        stops after the largest budget among its crops (or once all of them reached end of text).
+    num_beams: overrides the model's default set by load_model.
+    stats: optional DecodeStats collecting the tokens generated per line.
+    """
+    if budgets is None:
+        budgets = [max_new_tokens] * len(line_images)
+    texts = [None] * len(line_images)
+    keys = None
+    if cache is not None:
+        settings = decode_settings(model, max_new_tokens, num_beams)
+        keys = [cache.key(img, *settings, f"budget={b}") for img, b in zip(line_images, budgets)]
+        texts = [cache.get(key) for key in keys]
+    todo = sorted((i for i, text in enumerate(texts) if text is None), key=lambda i: budgets[i])
+
+    generate_kwargs = {} if num_beams is None else {"num_beams": num_beams, "early_stopping": num_beams > 1}
+    pad_token_id = processor.tokenizer.pad_token_id
+    for start in range(0, len(todo), batch_size):
+        idx = todo[start:start + batch_size]
+        pixel_values = processor(images=[line_images[i] for i in idx], return_tensors="pt").pixel_values
+        with torch.inference_mode():
+            generated_ids = model.generate(
+                pixel_values.to(model.dtype),
+                max_new_tokens=max(budgets[i] for i in idx),
+                **generate_kwargs
+            )
+        for i, text in zip(idx, processor.batch_decode(generated_ids, skip_special_tokens=True)):
+            texts[i] = text
+        if stats is not None:
+            # every row starts with the decoder start token, finished rows are padded
+            steps = generated_ids.shape[1] - 1
+            tokens = (generated_ids[:, 1:] != pad_token_id).sum(dim=1).tolist()
+            for i, n in zip(idx, tokens):
+                stats.add(budgets[i], n, steps)
+
+    if cache is not None and todo:
+        cache.put_many([(keys[i], texts[i]) for i in todo])
+    return texts
+
+def segment_page(image, page_num=1, trim=True, max_new_tokens=100):
+    """
+    Finds the text lines of a page and returns their prepared crops, top to bottom, as one list
+    of LineCrop chunks per line.  trim=False crops every line across the full page width instead.
+    Either way the decoding budget of a crop follows the width of its ink.
+    """
     print(f"✂️  Scanning Page {page_num}...")
     image = image.convert("RGB")
-    line_coords = remove_lines_and_find_text(image, page_num)
-    print(f"   - Found {len(line_coords)} lines.")
+    line_boxes = find_line_boxes(image, page_num)
+    print(f"   - Found {len(line_boxes)} lines.")
     
-    page_lines = []
-    for i, (y1, y2) in enumerate(line_coords):
-        line_img = image.crop((0, y1, image.width, y2))
-        
-        if line_img.width < 1000:
-            new_w = line_img.width * 2
-            new_h = line_img.height * 2
-            line_img = line_img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-        
-        line_img = ImageOps.expand(line_img, border=10, fill='white')
-        line_img = ImageOps.autocontrast(line_img.convert("L"), cutoff=1)
-        line_img = line_img.convert("RGB")
+    lines = []
+    for boxes in line_boxes:
+        if trim:
+            lines.append([
+                LineCrop(prepare_line_image(image, box), token_budget(box, max_new_tokens)) for box in boxes
+            ])
+        else:
+            (x1, y1, _, y2), x2 = boxes[0], boxes[-1][2]
+            lines.append([LineCrop(
+                prepare_line_image(image, (0, y1, image.width, y2)),
+                token_budget((x1, y1, x2, y2), max_new_tokens)
+            )])
+    return lines
 
-        pixel_values = processor(images=line_img, return_tensors="pt").pixel_values
-        generated_ids = model.generate(pixel_values, max_new_tokens=100)
-        text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-        
+def render_page(page, dpi=200):
+    pix = page.get_pixmap(dpi=dpi)
+    return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+def is_pdf(source):
+    """Whether a path or an in-memory file (bytes) is a PDF."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:5]) == b"%PDF-"
+    return source.lower().endswith(".pdf")
+
+def open_pdf(source):
+    """Opens a PDF from a path, or straight from its bytes without a temporary file."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+def open_image(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(source))
+    return Image.open(source)
+
+def iter_segmented_pdf(file_path, dpi=200, lookahead=2):
+    """
+    Yields (page_num, line_images) for every page of a PDF (a path or its bytes), line_images as
+    from segment_page.  Pages are rasterised and segmented
+    on a background thread while the caller recognises the previous ones; at most `lookahead`
+    finished pages wait in the queue, so memory stays flat however long the document is.
+    The document is only ever touched from that thread, PyMuPDF objects are not thread-safe.
+    """
+    pages = queue.Queue(maxsize=lookahead)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produce():
+        try:
+            with open_pdf(file_path) as doc:
+                for i, page in enumerate(doc):
+                    if stop.is_set():
+                        return
+                    put((i + 1, segment_page(render_page(page, dpi), i + 1)))
+        except Exception as e:
+            put(e)
+        put(None)
+
+    worker = threading.Thread(target=produce, name="pdf-segmenter", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+def iter_document(
+    file_path, processor, model, dpi=200, batch_size=8, lookahead=2, cache=None, num_beams=None, stats=None
+):
+    """
+    Yields a PageResult for every page of an image or PDF file as soon as that page is read, so
+    callers can show and save partial results of long documents.  For PDFs the next pages are
+    rasterised and segmented while the model reads the current one (see iter_segmented_pdf).
+    file_path may also be the file's bytes, e.g. an upload, which is then never written to disk.
+    """
+    if not is_pdf(file_path):
+        start = time.perf_counter()
+        text = process_single_image(
+            open_image(file_path), processor, model, batch_size=batch_size, cache=cache, num_beams=num_beams, stats=stats
+        )
+        yield PageResult(1, 1, text, time.perf_counter() - start)
+        return
+
+    with open_pdf(file_path) as doc:
+        num_pages = doc.page_count
+    start = time.perf_counter()
+    for page_num, line_images in iter_segmented_pdf(file_path, dpi=dpi, lookahead=lookahead):
+        text = recognize_page(
+            line_images, processor, model, batch_size=batch_size, cache=cache, num_beams=num_beams, stats=stats
+        )
+        yield PageResult(page_num, num_pages, text, time.perf_counter() - start)
+        # time the caller spends on a result is not the next page's
+        start = time.perf_counter()
+
+def process_pdf(file_path, processor, model, dpi=200, batch_size=8, lookahead=2, cache=None, num_beams=None, stats=None):
+    """Yields the text of every page of a PDF, recognising one page while the next are prepared."""
+    for result in iter_document(
+        file_path, processor, model, dpi=dpi, batch_size=batch_size, lookahead=lookahead,
+        cache=cache, num_beams=num_beams, stats=stats
+    ):
+        yield result.text
+
+def process_single_image(
+    image, processor, model, page_num=1, batch_size=8, trim=True, cache=None, num_beams=None, stats=None
+):
+    """
+    OCRs one page.  With a cache, a page seen before is answered without segmenting it, and lines
+    seen before (e.g. on another page of the same document) skip the model.
+    num_beams overrides the decoding default chosen in load_model; stats is an optional
+    DecodeStats that collects the tokens generated per line.
+    """
+    if cache is not None:
+        page_key = cache.key(image, "page", f"trim={trim}", *decode_settings(model, num_beams=num_beams))
+        text = cache.get(page_key)
+        if text is not None:
+            print(f"♻️  Page {page_num} found in cache.")
+            return text
+
+    line_images = segment_page(image, page_num, trim=trim)
+    text = recognize_page(
+        line_images, processor, model, batch_size=batch_size, cache=cache, num_beams=num_beams, stats=stats
+    )
+    if cache is not None:
+        cache.put(page_key, text)
+    return text
+
+def recognize_page(line_images, processor, model, batch_size=8, cache=None, num_beams=None, stats=None):
+    # chunks of all lines are batched together, then joined back into one text per line
+    chunks = [chunk for line in line_images for chunk in line]
+    chunk_texts = iter(recognize_lines(
+        [chunk.image for chunk in chunks], processor, model, batch_size=batch_size, cache=cache,
+        budgets=[chunk.budget for chunk in chunks], num_beams=num_beams, stats=stats
+    ))
+    texts = [" ".join(next(chunk_texts) for _ in line) for line in line_images]
+    
+    page_lines = []
+    for text in texts:
         cleaned = clean_line_text(text)
         if cleaned:
             page_lines.append(cleaned)
@@ -206,43 +552,35 @@ def main():
     processor, model = load_model()
     if processor is None:
         return
-
-    full_document_text = []
+    cache = load_cache()
 
     if file_path.lower().endswith(".pdf"):
         if fitz is None:
             print("\n❌ Error: PyMuPDF not installed. Run: pip install pymupdf")
             return
         print(f"\n📂 Processing PDF: {os.path.basename(file_path)}")
-        doc = fitz.open(file_path)
-        for i, page in enumerate(doc):
-            pix = page.get_pixmap(dpi=200)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            content = process_single_image(img, processor, model, page_num=i+1)
-            full_document_text.append(content)
     else:
         print(f"\n📂 Processing Image: {os.path.basename(file_path)}")
-        img = Image.open(file_path)
-        content = process_single_image(img, processor, model)
-        full_document_text.append(content)
-
-    final_output = "\n\n".join(full_document_text)
 
     # === SAVE TO FILE ===
+    # every page is written (and previewed) as soon as it is read, long scans never sit in memory
     try:
         with open(output_path, "w", encoding="utf-8") as f:
-            f.write(final_output)
+            for result in iter_document(file_path, processor, model, cache=cache):
+                if result.page_num > 1:
+                    f.write("\n\n")
+                f.write(result.text)
+                f.flush()
+
+                print(f"\n📜 PAGE {result.page_num}/{result.num_pages} ({result.seconds:.1f}s):")
+                print("-" * 20)
+                print(result.text)
+                print("-" * 20)
         print("\n" + "="*40)
         print(f"✅ SUCCESS! Output saved to:\n   {output_path}")
-        print("="*40)
+        print("="*40 + "\n")
     except Exception as e:
         print(f"\n❌ Could not save file: {e}")
 
-    # Print to console as well
-    print("\n📜 PREVIEW:")
-    print("-" * 20)
-    print(final_output)
-    print("-" * 20 + "\n")
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
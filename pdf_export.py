@@ -0,0 +1,83 @@
+import numpy as np
+from reportlab.graphics import renderPDF
+from reportlab.lib.colors import HexColor
+from reportlab.pdfgen import canvas
+
+
+class SvgPdfWriter(object):
+
+    """Appends SVG pages to a PDF one at a time, so pages can be added as soon as they are written.
+
+    Args:
+        filename: Output PDF path.
+        pagesize: (width, height) of every page, in the SVG's user units.
+    """
+
+    def __init__(self, filename, pagesize=(1860, 3508)):
+        # only the SVG route needs svglib, StrokePdfWriter works with reportlab alone
+        from svglib.svglib import svg2rlg
+
+        self.svg2rlg = svg2rlg
+        self.filename = filename
+        self.canvas = canvas.Canvas(filename, pagesize=pagesize)
+        self.num_pages = 0
+
+    def add_page(self, svg_file):
+        drawing = self.svg2rlg(svg_file)
+        renderPDF.draw(drawing, self.canvas, 0, 0)
+        self.canvas.showPage()
+        self.num_pages += 1
+
+    def save(self):
+        self.canvas.save()
+
+
+class StrokePdfWriter(object):
+
+    """Draws laid out pages (see demo.Hand._layout) straight into a PDF with reportlab's path API.
+
+    Unlike SvgPdfWriter nothing is serialised to SVG and parsed back, the (x, y, eos) arrays are
+    turned into PDF path operators directly.
+
+    Args:
+        filename: Output PDF path.
+        pagesize: (width, height) of every page, in the layout's units.
+        stroke_width: Width of the handwriting strokes.
+    """
+
+    def __init__(self, filename, pagesize=(1860, 3508), stroke_width=2.4):
+        self.filename = filename
+        self.height = pagesize[1]
+        self.stroke_width = stroke_width
+        self.canvas = canvas.Canvas(filename, pagesize=pagesize)
+        self.num_pages = 0
+
+    def add_page(self, rules, paths):
+        c = self.canvas
+        # layouts have y pointing down, PDF pages have it pointing up
+        for (x1, y1), (x2, y2), color, stroke_width in rules:
+            c.setStrokeColor(HexColor(color))
+            c.setLineWidth(stroke_width)
+            c.line(x1, self.height - y1, x2, self.height - y2)
+
+        c.setStrokeColor(HexColor('#000000'))
+        c.setLineWidth(self.stroke_width)
+        c.setLineCap(1)
+        c.setLineJoin(1)
+        for coords in paths:
+            if len(coords) == 0:
+                continue
+            path = c.beginPath()
+            # a new stroke starts at the first point and after every end-of-stroke point
+            starts = np.concatenate([[0], np.flatnonzero(coords[:-1, 2]) + 1])
+            for stroke in np.split(coords[:, :2], starts[1:]):
+                path.moveTo(stroke[0, 0], self.height - stroke[0, 1])
+                for x, y in stroke[1:]:
+                    path.lineTo(x, self.height - y)
+            c.drawPath(path, stroke=1, fill=0)
+
+        c.showPage()
+        self.num_pages += 1
+
+    def save(self):
+        self.canvas.save()
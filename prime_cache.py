@@ -0,0 +1,77 @@
+from collections import OrderedDict
+import os
+
+import numpy as np
+
+
+class PrimeCache(object):
+
+    """LRU cache of post-priming LSTMAttentionCell states, one entry per handwriting style.
+
+    Priming runs the model over a style's stroke sequence, which is the same for every line written
+    in that style.  Entries map each carried state field (see cell_state.CARRIED_STATE_FIELDS) to a 1D
+    array for a single line.
+
+    Args:
+        max_size: Maximum number of styles kept in memory.
+        cache_dir: If given, entries are also written to `style-{style}-primed.npz` in this directory
+            and read back on a memory miss, so a new process skips priming as well.
+        tag: Identifies the weights the states were computed with (e.g. the checkpoint name and
+            attention band).  Files written under a different tag are ignored and overwritten.
+    """
+
+    def __init__(self, max_size=16, cache_dir=None, tag=''):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.tag = tag
+        self.hits = 0
+        self.misses = 0
+        self._states = OrderedDict()
+
+    def get(self, style):
+        if style in self._states:
+            self._states.move_to_end(style)
+            self.hits += 1
+            return self._states[style]
+
+        state = self._load(style)
+        if state is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._insert(style, state)
+        return state
+
+    def put(self, style, state):
+        self._insert(style, state)
+        self._save(style, state)
+
+    def clear(self):
+        self._states.clear()
+
+    def __len__(self):
+        return len(self._states)
+
+    def _insert(self, style, state):
+        self._states[style] = state
+        self._states.move_to_end(style)
+        while len(self._states) > self.max_size:
+            self._states.popitem(last=False)
+
+    def _path(self, style):
+        return os.path.join(self.cache_dir, 'style-{}-primed.npz'.format(style))
+
+    def _load(self, style):
+        if self.cache_dir is None or not os.path.exists(self._path(style)):
+            return None
+        with np.load(self._path(style)) as f:
+            if str(f['tag']) != self.tag:
+                return None
+            return {name: f[name] for name in f.files if name != 'tag'}
+
+    def _save(self, style, state):
+        if self.cache_dir is None:
+            return
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        np.savez(self._path(style), tag=np.array(self.tag), **state)
@@ -6,7 +6,7 @@ import tensorflow.compat.v1 as tf
 tf.disable_v2_behavior()
 
 import drawing
-from rnn_cell import LSTMAttentionCell
+from rnn_cell import LSTMAttentionCell, LSTMAttentionCellState
 from rnn_ops import rnn_free_run
 from tf_base_model import TFBaseModel
 from tf_utils import time_distributed_dense_layer
@@ -22,12 +22,16 @@ class rnn(TFBaseModel):
         lstm_size,
         output_mixture_components,
         attention_mixture_components,
+        attention_band=None,
+        record_sample_states=False,
         **kwargs
     ):
         self.lstm_size = lstm_size
         self.output_mixture_components = output_mixture_components
         self.output_units = self.output_mixture_components*6 + 1
         self.attention_mixture_components = attention_mixture_components
+        self.attention_band = attention_band
+        self.record_sample_states = record_sample_states
         super(rnn, self).__init__(**kwargs)
 
     def parse_parameters(self, z, eps=1e-8, sigma_eps=1e-4):
@@ -91,9 +95,9 @@ class rnn(TFBaseModel):
             scope='rnn'
         )[1]
 
-    def primed_sample(self, cell):
+    def prime_state(self, cell):
         initial_state = cell.zero_state(self.num_samples, dtype=tf.float32)
-        primed_state = tf.nn.dynamic_rnn(
+        return tf.nn.dynamic_rnn(
             inputs=self.x_prime,
             cell=cell,
             sequence_length=self.x_prime_len,
@@ -101,14 +105,36 @@ class rnn(TFBaseModel):
             initial_state=initial_state,
             scope='rnn'
         )[1]
+
+    def primed_sample(self, cell):
         return rnn_free_run(
             cell=cell,
             sequence_length=self.sample_tsteps,
-            initial_state=primed_state,
+            initial_state=self.prime_state(cell),
             scope='rnn'
         )[1]
 
-    def calculate_loss(self):
+    def sample_from_state(self, cell):
+        """
+        Samples starting from the state fed through self.sample_state, e.g. a cached primed state.
+        Only the carried fields are fed; w and phi are recomputed against self.c.  The first input
+        is sampled from that state unless self.sample_input is fed, which allows resuming a run
+        from its final state and last output.  Returns the per-step states, the samples, the final
+        state and which lines terminated (see rnn_ops.rnn_free_run).
+        """
+        initial_state = cell.attend(self.sample_state)
+        with tf.variable_scope('rnn', reuse=tf.AUTO_REUSE):
+            self.sample_input = tf.placeholder_with_default(cell.output_function(initial_state), [None, 3])
+        return rnn_free_run(
+            cell=cell,
+            sequence_length=self.sample_tsteps,
+            initial_state=initial_state,
+            initial_input=self.sample_input,
+            scope='rnn',
+            record_states=self.record_sample_states
+        )
+
+    def build_placeholders(self):
         self.x = tf.placeholder(tf.float32, [None, None, 3])
         self.y = tf.placeholder(tf.float32, [None, None, 3])
         self.x_len = tf.placeholder(tf.int32, [None])
@@ -123,14 +149,35 @@ class rnn(TFBaseModel):
         self.bias = tf.placeholder_with_default(
             tf.zeros([self.num_samples], dtype=tf.float32), [None])
 
-        cell = LSTMAttentionCell(
+        lstm_state = [tf.placeholder(tf.float32, [None, self.lstm_size]) for _ in range(6)]
+        attention_state = [tf.placeholder(tf.float32, [None, self.attention_mixture_components]) for _ in range(3)]
+        self.sample_state = LSTMAttentionCellState(*(lstm_state + attention_state + [None, None]))
+
+    def build_cell(self):
+        return LSTMAttentionCell(
             lstm_size=self.lstm_size,
             num_attn_mixture_components=self.attention_mixture_components,
             attention_values=tf.one_hot(self.c, len(drawing.alphabet)),
             attention_values_lengths=self.c_len,
             num_output_mixture_components=self.output_mixture_components,
-            bias=self.bias
+            bias=self.bias,
+            attention_band=self.attention_band
         )
+
+    def build_sampler(self, cell):
+        self.sampled_sequence = tf.cond(
+            self.prime,
+            lambda: self.primed_sample(cell),
+            lambda: self.sample(cell)
+        )
+        self.primed_state = self.prime_state(cell)
+        (self.sampled_states, self.sampled_from_state,
+         self.sampled_final_state, self.sampled_terminated) = self.sample_from_state(cell)
+
+    def calculate_loss(self):
+        self.build_placeholders()
+        cell = self.build_cell()
+
         self.initial_state = cell.zero_state(tf.shape(self.x)[0], dtype=tf.float32)
         outputs, self.final_state = tf.nn.dynamic_rnn(
             inputs=self.x,
@@ -144,12 +191,18 @@ class rnn(TFBaseModel):
         pis, mus, sigmas, rhos, es = self.parse_parameters(params)
         sequence_loss, self.loss = self.NLL(self.y, self.x_len, pis, mus, sigmas, rhos, es)
 
-        self.sampled_sequence = tf.cond(
-            self.prime,
-            lambda: self.primed_sample(cell),
-            lambda: self.sample(cell)
-        )
+        self.build_sampler(cell)
         return self.loss
 
-
-
+    def calculate_inference(self):
+        """
+        Sampling-only graph used when restoring a trained model.  Only the ops Hand runs are built,
+        priming and sampling from a fed state, which create the same variables
+        (rnn/LSTMAttentionCell/*, rnn/gmm/*) as the training graph, so checkpoints written during
+        training restore into it directly.
+        """
+        self.build_placeholders()
+        cell = self.build_cell()
+        self.primed_state = self.prime_state(cell)
+        (self.sampled_states, self.sampled_from_state,
+         self.sampled_final_state, self.sampled_terminated) = self.sample_from_state(cell)
@@ -1,16 +1,35 @@
-from collections import namedtuple
-
 import tensorflow.compat.v1 as tf
-import tensorflow_probability.python.distributions as tfd
 import numpy as np
 
+from cell_state import LSTMAttentionCellState
 from tf_utils import dense_layer, shape
 
 
-LSTMAttentionCellState = namedtuple(
-    'LSTMAttentionCellState',
-    ['h1', 'c1', 'h2', 'c2', 'h3', 'c3', 'alpha', 'beta', 'kappa', 'w', 'phi']
-)
+def sample_output_mixture(pis, mus, sigmas, rhos, es):
+    """
+    Draws one (x, y, eos) offset per row from the output mixture.  The component is drawn first
+    and only its bivariate normal is sampled, in closed form from two standard normals:
+    x = mu1 + sigma1*z1, y = mu2 + sigma2*(rho*z1 + sqrt(1 - rho^2)*z2).
+
+    pis and rhos are [batch_size, K], mus and sigmas [batch_size, 2*K] (x components first) and
+    es [batch_size, 1], as returned by LSTMAttentionCell._parse_parameters.
+    """
+    # pis are not renormalised after small components are zeroed, categorical takes unnormalised logits
+    idx = tf.random.categorical(tf.log(pis), 1, dtype=tf.int32)
+
+    def select(params):
+        return tf.gather(params, idx, batch_dims=1)
+
+    mu1, mu2 = map(select, tf.split(mus, 2, axis=1))
+    sigma1, sigma2 = map(select, tf.split(sigmas, 2, axis=1))
+    rho = select(rhos)
+
+    z1 = tf.random.normal(tf.shape(rho))
+    z2 = tf.random.normal(tf.shape(rho))
+    x = mu1 + sigma1*z1
+    y = mu2 + sigma2*(rho*z1 + tf.sqrt(1.0 - tf.square(rho))*z2)
+    e = tf.cast(tf.random.uniform(tf.shape(es)) < es, tf.float32)
+    return tf.concat([x, y, e], axis=1)
 
 
 class LSTMAttentionCell(tf.compat.v1.nn.rnn_cell.RNNCell):
@@ -23,8 +42,13 @@ class LSTMAttentionCell(tf.compat.v1.nn.rnn_cell.RNNCell):
         attention_values_lengths,
         num_output_mixture_components,
         bias,
+        attention_band=None,
         reuse=None,
     ):
+        """
+        attention_band: number of character positions the attention window is evaluated at, centred
+            on its current position.  None evaluates it over the whole character sequence.
+        """
         self.reuse = reuse
         self.lstm_size = lstm_size
         self.num_attn_mixture_components = num_attn_mixture_components
@@ -33,6 +57,10 @@ class LSTMAttentionCell(tf.compat.v1.nn.rnn_cell.RNNCell):
         self.window_size = shape(self.attention_values, 2)
         self.char_len = tf.shape(attention_values)[1]
         self.batch_size = tf.shape(attention_values)[0]
+        self.attention_band = attention_band
+        # the padding mask doesn't change between steps, so it is applied once outside the loop
+        sequence_mask = tf.sequence_mask(attention_values_lengths, maxlen=self.char_len, dtype=tf.float32)
+        self.masked_attention_values = attention_values*tf.expand_dims(sequence_mask, 2)
         self.num_output_mixture_components = num_output_mixture_components
         self.output_units = 6*self.num_output_mixture_components + 1
         self.bias = bias
@@ -87,17 +115,7 @@ class LSTMAttentionCell(tf.compat.v1.nn.rnn_cell.RNNCell):
             kappa = state.kappa + kappa / 25.0
             beta = tf.clip_by_value(beta, .01, np.inf)
 
-            kappa_flat, alpha_flat, beta_flat = kappa, alpha, beta
-            kappa, alpha, beta = tf.expand_dims(kappa, 2), tf.expand_dims(alpha, 2), tf.expand_dims(beta, 2)
-
-            enum = tf.reshape(tf.range(self.char_len), (1, 1, self.char_len))
-            u = tf.cast(tf.tile(enum, (self.batch_size, self.num_attn_mixture_components, 1)), tf.float32)
-            phi_flat = tf.reduce_sum(alpha*tf.exp(-tf.square(kappa - u) / beta), axis=1)
-
-            phi = tf.expand_dims(phi_flat, 2)
-            sequence_mask = tf.cast(tf.sequence_mask(self.attention_values_lengths, maxlen=self.char_len), tf.float32)
-            sequence_mask = tf.expand_dims(sequence_mask, 2)
-            w = tf.reduce_sum(phi*self.attention_values*sequence_mask, axis=1)
+            w, phi_flat = self.attention_window(alpha, beta, kappa)
 
             # lstm 2
             s2_in = tf.concat([inputs, s1_out, w], axis=1)
@@ -116,44 +134,79 @@ class LSTMAttentionCell(tf.compat.v1.nn.rnn_cell.RNNCell):
                 s2_state.c,
                 s3_state.h,
                 s3_state.c,
-                alpha_flat,
-                beta_flat,
-                kappa_flat,
+                alpha,
+                beta,
+                kappa,
                 w,
                 phi_flat,
             )
 
             return s3_out, new_state
 
-    def output_function(self, state):
-        params = dense_layer(state.h3, self.output_units, scope='gmm', reuse=tf.AUTO_REUSE)
-        pis, mus, sigmas, rhos, es = self._parse_parameters(params)
-        mu1, mu2 = tf.split(mus, 2, axis=1)
-        mus = tf.stack([mu1, mu2], axis=2)
-        sigma1, sigma2 = tf.split(sigmas, 2, axis=1)
-
-        covar_matrix = [tf.square(sigma1), rhos*sigma1*sigma2,
-                        rhos*sigma1*sigma2, tf.square(sigma2)]
-        covar_matrix = tf.stack(covar_matrix, axis=2)
-        covar_matrix = tf.reshape(covar_matrix, (self.batch_size, self.num_output_mixture_components, 2, 2))
-
-        mvn = tfd.MultivariateNormalFullCovariance(loc=mus, covariance_matrix=covar_matrix)
-        b = tfd.Bernoulli(probs=es)
-        c = tfd.Categorical(probs=pis)
+    def attention_window(self, alpha, beta, kappa):
+        """
+        Evaluates the gaussian window over the character sequence.  Returns the window vector w
+        of shape [batch_size, window_size] and the window weights phi of shape [batch_size, char_len].
+        With attention_band set, phi is only evaluated in the band and is zero elsewhere.
+        """
+        if self.attention_band is not None:
+            return self.banded_attention_window(alpha, beta, kappa)
+
+        kappa, alpha, beta = tf.expand_dims(kappa, 2), tf.expand_dims(alpha, 2), tf.expand_dims(beta, 2)
+
+        u = tf.cast(tf.reshape(tf.range(self.char_len), (1, 1, self.char_len)), tf.float32)
+        phi_flat = tf.reduce_sum(alpha*tf.exp(-tf.square(kappa - u) / beta), axis=1)
+
+        w = tf.reduce_sum(tf.expand_dims(phi_flat, 2)*self.masked_attention_values, axis=1)
+        return w, phi_flat
+
+    def banded_attention_window(self, alpha, beta, kappa):
+        """
+        attention_window over the attention_band positions around the alpha-weighted mean of kappa.
+        kappa only moves forward and the gaussians are a few characters wide, so the weights outside
+        the band are negligible.
+        """
+        band = tf.minimum(self.attention_band, self.char_len)
+        center = tf.reduce_sum(alpha*kappa, axis=1) / tf.maximum(tf.reduce_sum(alpha, axis=1), 1e-8)
+        start = tf.clip_by_value(tf.cast(tf.round(center), tf.int32) - band // 2, 0, self.char_len - band)
+        positions = tf.expand_dims(start, 1) + tf.expand_dims(tf.range(band), 0)
+
+        kappa, alpha, beta = tf.expand_dims(kappa, 2), tf.expand_dims(alpha, 2), tf.expand_dims(beta, 2)
+        u = tf.cast(tf.expand_dims(positions, 1), tf.float32)
+        phi_band = tf.reduce_sum(alpha*tf.exp(-tf.square(kappa - u) / beta), axis=1)
+
+        values = tf.gather(self.masked_attention_values, positions, batch_dims=1)
+        w = tf.reduce_sum(tf.expand_dims(phi_band, 2)*values, axis=1)
+
+        rows = tf.tile(tf.expand_dims(tf.range(self.batch_size), 1), [1, band])
+        phi_flat = tf.scatter_nd(
+            tf.stack([rows, positions], axis=2), phi_band, tf.stack([self.batch_size, self.char_len])
+        )
+        return w, phi_flat
 
-        sampled_e = b.sample()
-        sampled_coords = mvn.sample()
-        sampled_idx = c.sample()
+    def attend(self, state):
+        """
+        Recomputes w and phi of a state from its alpha, beta and kappa against this cell's
+        character sequence, so a state saved after priming can be resumed on a different text.
+        """
+        # beta is clipped like in __call__, a fresh all-zero state would otherwise divide 0 by 0
+        w, phi = self.attention_window(state.alpha, tf.maximum(state.beta, .01), state.kappa)
+        return state._replace(w=w, phi=phi)
 
-        idx = tf.stack([tf.range(self.batch_size), sampled_idx], axis=1)
-        coords = tf.gather_nd(sampled_coords, idx)
-        return tf.concat([coords, tf.cast(sampled_e, tf.float32)], axis=1)
+    def output_function(self, state):
+        params = dense_layer(state.h3, self.output_units, scope='gmm', reuse=tf.AUTO_REUSE)
+        return sample_output_mixture(*self._parse_parameters(params))
 
-    def termination_condition(self, state):
+    def termination_condition(self, state, output=None):
+        """
+        output is the point sampled from state by output_function; pass it to end on the same
+        pen-up that is emitted instead of drawing a second sample.
+        """
         char_idx = tf.cast(tf.argmax(state.phi, axis=1), tf.int32)
         final_char = char_idx >= self.attention_values_lengths - 1
         past_final_char = char_idx >= self.attention_values_lengths
-        output = self.output_function(state)
+        if output is None:
+            output = self.output_function(state)
         es = tf.cast(output[:, 2], tf.int32)
         is_eos = tf.equal(es, tf.ones_like(es))
         return tf.logical_or(tf.logical_and(final_char, is_eos), past_final_char)
@@ -43,17 +43,21 @@ def _maybe_tensor_shape_from_tensor(shape):
         return tensor_shape.TensorShape(None)
 
 
-def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, scope=None):
+def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, scope=None, record_states=True):
     """
     raw_rnn adapted from the original tensorflow implementation
     (https://github.com/tensorflow/tensorflow/blob/r1.4/tensorflow/python/ops/rnn.py)
     to emit arbitrarily nested states for each time step (concatenated along the time axis)
     in addition to the outputs at each timestep and the final state
 
+    if record_states is False the per-timestep states are not written to TensorArrays
+    and None is returned in their place, which keeps memory proportional to the outputs.
+
     returns (
         states for all timesteps,
         outputs for all timesteps,
         final cell state,
+        final loop state,
     )
     """
     if not _like_rnncell(cell):
@@ -131,18 +135,22 @@ def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, scope=No
 
         zero_emit = nest.pack_sequence_as(structure=emit_structure, flat_sequence=flat_zero_emit)
 
-        flat_state_ta = [
-            tensor_array_ops.TensorArray(
-                dtype=dtype_i,
-                dynamic_size=True,
-                element_shape=(tensor_shape.TensorShape([const_batch_size])
-                               .concatenate(_maybe_tensor_shape_from_tensor(size_i))),
-                size=0,
-                name="rnn_state_%d" % i
-            )
-            for i, (dtype_i, size_i) in enumerate(zip(flat_state_dtypes, flat_state_size))
-        ]
-        state_ta = nest.pack_sequence_as(structure=state, flat_sequence=flat_state_ta)
+        if record_states:
+            flat_state_ta = [
+                tensor_array_ops.TensorArray(
+                    dtype=dtype_i,
+                    dynamic_size=True,
+                    element_shape=(tensor_shape.TensorShape([const_batch_size])
+                                   .concatenate(_maybe_tensor_shape_from_tensor(size_i))),
+                    size=0,
+                    name="rnn_state_%d" % i
+                )
+                for i, (dtype_i, size_i) in enumerate(zip(flat_state_dtypes, flat_state_size))
+            ]
+            state_ta = nest.pack_sequence_as(structure=state, flat_sequence=flat_state_ta)
+        else:
+            # Surrogate loop variable, states are not recorded.
+            state_ta = constant_op.constant(0, dtype=dtypes.int32)
 
         def condition(unused_time, elements_finished, *_):
             return math_ops.logical_not(math_ops.reduce_all(elements_finished))
@@ -181,7 +189,8 @@ def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, scope=No
             next_state = _copy_some_through(state, next_state)
 
             emit_ta = nest.map_structure(lambda ta, emit: ta.write(time, emit), emit_ta, emit_output)
-            state_ta = nest.map_structure(lambda ta, state: ta.write(time, state), state_ta, next_state)
+            if record_states:
+                state_ta = nest.map_structure(lambda ta, state: ta.write(time, state), state_ta, next_state)
 
             elements_finished = math_ops.logical_or(elements_finished, next_finished)
 
@@ -198,15 +207,17 @@ def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, scope=No
 
         (state_ta, emit_ta, final_state, final_loop_state) = returned[-4:]
 
-        flat_states = nest.flatten(state_ta)
-        flat_states = [array_ops.transpose(ta.stack(), (1, 0, 2)) for ta in flat_states]
-        states = nest.pack_sequence_as(structure=state_ta, flat_sequence=flat_states)
+        states = None
+        if record_states:
+            flat_states = nest.flatten(state_ta)
+            flat_states = [array_ops.transpose(ta.stack(), (1, 0, 2)) for ta in flat_states]
+            states = nest.pack_sequence_as(structure=state_ta, flat_sequence=flat_states)
 
         flat_outputs = nest.flatten(emit_ta)
         flat_outputs = [array_ops.transpose(ta.stack(), (1, 0, 2)) for ta in flat_outputs]
         outputs = nest.pack_sequence_as(structure=emit_ta, flat_sequence=flat_outputs)
 
-        return (states, outputs, final_state)
+        return (states, outputs, final_state, final_loop_state)
 
 
 def rnn_teacher_force(inputs, cell, sequence_length, initial_state, scope='dynamic-rnn-teacher-force'):
@@ -234,11 +245,12 @@ def rnn_teacher_force(inputs, cell, sequence_length, initial_state, scope='dynam
         next_loop_state = None
         return (elements_finished, next_input, next_cell_state, emit_output, next_loop_state)
 
-    states, outputs, final_state = raw_rnn(cell, loop_fn, scope=scope)
+    states, outputs, final_state, _ = raw_rnn(cell, loop_fn, scope=scope)
     return states, outputs, final_state
 
 
-def rnn_free_run(cell, initial_state, sequence_length, initial_input=None, scope='dynamic-rnn-free-run'):
+def rnn_free_run(cell, initial_state, sequence_length, initial_input=None, scope='dynamic-rnn-free-run',
+                 record_states=False):
     """
     Implementation of an rnn which feeds its feeds its predictions back to itself at the next timestep.
 
@@ -247,8 +259,19 @@ def rnn_free_run(cell, initial_state, sequence_length, initial_input=None, scope
         cell.output_function(state) which takes in the state at timestep t and returns
         the cell input at timestep t+1.
 
-        cell.termination_condition(state) which returns a boolean tensor of shape
-        [batch_size] denoting which sequences no longer need to be sampled.
+        cell.termination_condition(state, output) which returns a boolean tensor of shape
+        [batch_size] denoting which sequences no longer need to be sampled, given the state
+        and the output sampled from it.
+
+    output_function is evaluated once per timestep: the same sample is emitted, fed back as
+    the next input and used to decide termination.
+
+    Per-timestep states are only returned (instead of None) if record_states is True, e.g. to
+    inspect the attention window, since keeping them costs far more memory than the outputs.
+
+    Also returns a boolean tensor of shape [batch_size] telling which sequences met the
+    termination condition, as opposed to being cut off at sequence_length.  Those cut off emit
+    their last sample, so the run can be resumed from the final state and that sample.
     """
     with vs.variable_scope(scope, reuse=True):
         if initial_input is None:
@@ -256,22 +279,21 @@ def rnn_free_run(cell, initial_state, sequence_length, initial_input=None, scope
 
     def loop_fn(time, cell_output, cell_state, loop_state):
         next_cell_state = initial_state if cell_output is None else cell_state
+        output = initial_input if cell_output is None else cell.output_function(next_cell_state)
 
-        elements_finished = math_ops.logical_or(
-            time >= sequence_length,
-            cell.termination_condition(next_cell_state)
-        )
-        finished = math_ops.reduce_all(elements_finished)
+        # the loop state tracks the sequences that terminated, once true it stays true
+        terminated = cell.termination_condition(next_cell_state, output)
+        if loop_state is not None:
+            terminated = math_ops.logical_or(loop_state, terminated)
+        elements_finished = math_ops.logical_or(time >= sequence_length, terminated)
 
         next_input = tf.cond(
-            finished,
+            math_ops.reduce_all(terminated),
             lambda: array_ops.zeros_like(initial_input),
-            lambda: initial_input if cell_output is None else cell.output_function(next_cell_state)
+            lambda: output
         )
         emit_output = next_input[0] if cell_output is None else next_input
 
-        next_loop_state = None
-        return (elements_finished, next_input, next_cell_state, emit_output, next_loop_state)
+        return (elements_finished, next_input, next_cell_state, emit_output, terminated)
 
-    states, outputs, final_state = raw_rnn(cell, loop_fn, scope=scope)
-    return states, outputs, final_state
+    return raw_rnn(cell, loop_fn, scope=scope, record_states=record_states)
@@ -0,0 +1,107 @@
+from concurrent.futures import Future
+import queue
+import threading
+import time
+
+
+class SynthesisScheduler(object):
+
+    """Collects lines from concurrent write requests and samples them together.
+
+    Every caller of Hand.write used to sample its own pages one batch at a time.  The scheduler
+    queues the lines of all pending requests and a single worker thread packs them into batches
+    of up to max_batch_size lines, so one session.run serves several documents at once.  Results
+    are routed back through one Future per line.
+
+    Args:
+        hand: demo.Hand whose model is used for sampling.
+        max_batch_size: Maximum number of lines sampled together.
+        max_wait: Seconds the oldest queued line waits for more lines before its batch is sampled
+            anyway.  Larger values build fuller batches at the cost of latency when idle.
+    """
+
+    def __init__(self, hand, max_batch_size=25, max_wait=0.05):
+        self.hand = hand
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches_run = 0
+        self.lines_run = 0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='synthesis-scheduler', daemon=True)
+        self._worker.start()
+
+    def submit(self, lines, biases=None, styles=None):
+        """
+        Queues lines for sampling and returns one Future per line resolving to its strokes.
+        Raises ValueError right away for a request the model can't sample (see
+        Hand._validate_request), before its lines can share a batch with other callers' lines.
+        """
+        self.hand._validate_request(lines, biases, styles)
+        futures = []
+        for i, line in enumerate(lines):
+            future = Future()
+            bias = biases[i] if biases is not None else None
+            style = styles[i] if styles else None
+            self._queue.put((line, bias, style, future))
+            futures.append(future)
+        return futures
+
+    def sample(self, lines, biases=None, styles=None):
+        """Blocking equivalent of Hand._sample."""
+        return [future.result() for future in self.submit(lines, biases, styles)]
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is None:
+            return None
+
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            # primed and unprimed lines start from different states, sample them separately
+            for primed in (True, False):
+                items = [item for item in batch if (item[2] is not None) == primed]
+                if items:
+                    self._sample(items, primed)
+
+    def _sample(self, items, primed):
+        lines, biases, styles, futures = zip(*items)
+        try:
+            strokes = self.hand._sample(list(lines), biases=list(biases), styles=list(styles) if primed else None)
+        except Exception as e:
+            if len(items) > 1:
+                # sample the lines one at a time, so the error only reaches the request it came from
+                for item in items:
+                    self._sample([item], primed)
+                return
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.lines_run += len(lines)
+        for future, s in zip(futures, strokes):
+            future.set_result(s)
@@ -0,0 +1,65 @@
+import os
+import re
+
+import numpy as np
+
+import drawing
+
+
+class StyleBank(object):
+
+    """The handwriting styles in a styles directory, each read from disk at most once.
+
+    A style is a pair of `style-{id}-strokes.npy` (the stroke offsets used to prime the model) and
+    `style-{id}-chars.npy` (their transcription as utf-8 bytes).  The ids are discovered when the
+    bank is created; strokes are memory-mapped and the transcription is decoded and encoded with
+    drawing.encode_ascii the first time a style is used, so assembling a batch afterwards only
+    copies arrays.
+
+    Args:
+        styles_dir: Directory holding the style files.
+    """
+
+    def __init__(self, styles_dir):
+        self.styles_dir = styles_dir
+        names = os.listdir(styles_dir) if os.path.isdir(styles_dir) else []
+        ids = [int(m.group(1)) for m in map(re.compile(r'style-(\d+)-strokes\.npy$').match, names) if m]
+        self.ids = sorted(i for i in ids if 'style-{}-chars.npy'.format(i) in names)
+        self._strokes = {}
+        self._chars = {}
+        self._prefixes = {}
+
+    def __contains__(self, style):
+        return style in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def validate(self, styles):
+        """Raises ValueError naming every style id in `styles` that the bank doesn't hold."""
+        unknown = sorted(set(s for s in styles if s not in self))
+        if unknown:
+            raise ValueError('unknown style id(s) {}, available styles are {}'.format(unknown, self.ids))
+
+    def strokes(self, style):
+        """Read-only [num_points, 3] stroke offsets of the style, memory-mapped."""
+        if style not in self._strokes:
+            self.validate([style])
+            self._strokes[style] = np.load(self._path(style, 'strokes'), mmap_mode='r')
+        return self._strokes[style]
+
+    def chars(self, style):
+        """Transcription of the style's strokes."""
+        if style not in self._chars:
+            self.validate([style])
+            self._chars[style] = np.load(self._path(style, 'chars')).tobytes().decode('utf-8')
+        return self._chars[style]
+
+    def prefix(self, style):
+        """drawing.encode_ascii of `chars(style) + " "`, without the terminating 0."""
+        if style not in self._prefixes:
+            self._prefixes[style] = drawing.encode_ascii(self.chars(style) + ' ')[:-1]
+        return self._prefixes[style]
+
+    def _path(self, style, kind):
+        return os.path.join(self.styles_dir, 'style-{}-{}.npy'.format(style, kind))
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the model's TF1 cells need the Keras 2 shims, like in demo.py and benchmark.py
+os.environ['TF_USE_LEGACY_KERAS'] = '1'
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+
+@pytest.fixture(scope='session')
+def random_weights(tmp_path_factory):
+    """A small randomly initialised model in the format of numpy_engine.export_weights."""
+    import drawing
+    from numpy_engine import WEIGHT_NAMES
+
+    rng = np.random.default_rng(0)
+    lstm_size, window_size, attention, output = 32, len(drawing.alphabet), 3*10, 6*20 + 1
+    shapes = {
+        'lstm1_kernel': [window_size + 3 + lstm_size, 4*lstm_size],
+        'lstm1_bias': [4*lstm_size],
+        'attention_weights': [window_size + 3 + lstm_size, attention],
+        'attention_biases': [attention],
+        'lstm2_kernel': [3 + lstm_size + window_size + lstm_size, 4*lstm_size],
+        'lstm2_bias': [4*lstm_size],
+        'lstm3_kernel': [3 + lstm_size + window_size + lstm_size, 4*lstm_size],
+        'lstm3_bias': [4*lstm_size],
+        'gmm_weights': [lstm_size, output],
+        'gmm_biases': [output],
+    }
+    assert set(shapes) == set(WEIGHT_NAMES)
+    path = str(tmp_path_factory.mktemp('weights') / 'weights.npz')
+    # scaled like the variance scaling initializer the layers are created with, larger weights make
+    # the attention run away during long priming sequences
+    np.savez(path, checkpoint=np.array('random'), **{
+        key: (rng.standard_normal(shape) / np.sqrt(shape[0] if len(shape) == 2 else 10)).astype(np.float32)
+        for key, shape in shapes.items()
+    })
+    return path
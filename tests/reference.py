@@ -0,0 +1,264 @@
+"""
+Reference implementations and synthetic inputs shared by the tests and benchmark.py.
+
+The legacy_* functions are the loop implementations that were vectorised, kept verbatim so
+the tests can check the new code against them and the benchmarks can time both.
+"""
+import textwrap
+
+SAMPLE_TEXT = (
+    "The quick brown fox jumps over the lazy dog while the five boxing wizards jump quickly. "
+    "Pack my box with five dozen liquor jugs, then sphinx of black quartz, judge my vow. "
+) * 8
+
+
+def page_lines(num_lines=25, width=65):
+    """One page worth of lines, wrapped like Hand.write does on the default A4 layout."""
+    return textwrap.wrap(SAMPLE_TEXT * (num_lines // 10 + 1), width=width)[:num_lines]
+
+
+def synthetic_page(num_lines=30, width=1654, height=2339, seed=0):
+    """
+    A 200-dpi A4 notebook page (the size ocr_page rasterises PDFs at) with num_lines lines of
+    printed text on light blue ruling, so segmentation and the grid eraser have real work to do.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=40)
+    except TypeError:  # Pillow < 10.1 only has the small bitmap font
+        font = ImageFont.load_default()
+
+    lines = synthetic_page_lines(num_lines, seed)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    line_gap = (height - 300) // num_lines
+    draw.line([(100, 0), (100, height)], fill=(255, 176, 176), width=2)
+    for i, line in enumerate(lines):
+        y = 150 + (i + 1) * line_gap
+        draw.line([(0, y), (width, y)], fill=(174, 194, 214), width=2)
+        draw.text((120, y - 50), line, fill="black", font=font)
+    return image
+
+
+def synthetic_page_lines(num_lines=30, seed=0):
+    """The text printed on synthetic_page(num_lines, seed=seed), one string per line."""
+    return page_lines(num_lines + seed)[seed:]
+
+
+def legacy_find_text(image):
+    # remove_lines_and_find_text before vectorisation, kept as the reference implementation
+    import numpy as np
+
+    gray = image.convert("L")
+    w, h = gray.size
+    np_gray = np.array(gray)
+    threshold = np.mean(np_gray) - 25
+    binary = (np_gray < threshold).astype(int)
+
+    b_h, b_w = binary.shape
+    col_sums = np.sum(binary, axis=0)
+    row_sums = np.sum(binary, axis=1)
+    is_vert_line = col_sums > b_h * 0.50
+    if np.any(is_vert_line): binary[:, is_vert_line] = 0
+    is_horz_line = row_sums > b_w * 0.50
+    if np.any(is_horz_line): binary[is_horz_line, :] = 0
+
+    row_sums = np.sum(binary, axis=1)
+    has_ink = row_sums > 5
+
+    lines = []
+    start_y = None
+    for y, is_ink in enumerate(has_ink):
+        if is_ink and start_y is None:
+            start_y = y
+        elif not is_ink and start_y is not None:
+            end_y = y
+            if end_y - start_y > 8:
+                pad = 4
+                lines.append((max(0, start_y - pad), min(h, end_y + pad)))
+            start_y = None
+    if start_y is not None:
+        lines.append((start_y, len(has_ink)))
+    return lines
+
+
+def synthetic_strokes(num_points, seed=0, dtype='float32'):
+    """Random-walk (x, y, eos) coordinates with strokes of 1 to ~40 points, like a sampled line."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    offsets = np.concatenate([rng.normal(size=[num_points, 2]), rng.random([num_points, 1]) < 0.06], axis=1)
+    offsets[:5, 2] = [1, 0, 1, 0, 0][:num_points]  # strokes of 1 and 2 points
+    coords = np.concatenate([np.cumsum(offsets[:, :2], axis=0), offsets[:, 2:]], axis=1)
+    return coords.astype(dtype)
+
+
+def synthetic_page_offsets(num_lines=25, num_points=600, seed=0):
+    """Stroke offsets and text of a page like Hand._sample returns, with some blank and very short lines."""
+    import numpy as np
+
+    strokes, lines = [], []
+    for i in range(num_lines):
+        n = [0, 1, 2, 3, 7][i] if i < 5 else num_points - 13 * (i % 7)
+        coords = synthetic_strokes(n, seed + i, 'float64')
+        strokes.append(np.concatenate([np.diff(coords[:, :2], axis=0, prepend=0.0), coords[:, 2:]], axis=1))
+        lines.append('' if i == 7 else 'line {}'.format(i))
+    return strokes, lines
+
+
+def legacy_denoise(coords):
+    # drawing.denoise before vectorisation, kept as the reference implementation
+    import numpy as np
+    from scipy.signal import savgol_filter
+
+    coords = np.split(coords, np.where(coords[:, 2] == 1)[0] + 1, axis=0)
+    new_coords = []
+    for stroke in coords:
+        if len(stroke) != 0:
+            x_new = savgol_filter(stroke[:, 0], 7, 3, mode='nearest')
+            y_new = savgol_filter(stroke[:, 1], 7, 3, mode='nearest')
+            xy_coords = np.hstack([x_new.reshape(-1, 1), y_new.reshape(-1, 1)])
+            stroke = np.concatenate([xy_coords, stroke[:, 2].reshape(-1, 1)], axis=1)
+            new_coords.append(stroke)
+    return np.vstack(new_coords)
+
+
+def legacy_interpolate(coords, factor=2):
+    # drawing.interpolate before vectorisation, kept as the reference implementation
+    import numpy as np
+    from scipy.interpolate import interp1d
+
+    coords = np.split(coords, np.where(coords[:, 2] == 1)[0] + 1, axis=0)
+    new_coords = []
+    for stroke in coords:
+        if len(stroke) == 0:
+            continue
+        xy_coords = stroke[:, :2]
+        if len(stroke) > 3:
+            f_x = interp1d(np.arange(len(stroke)), stroke[:, 0], kind='cubic')
+            f_y = interp1d(np.arange(len(stroke)), stroke[:, 1], kind='cubic')
+            xx = np.linspace(0, len(stroke) - 1, factor*(len(stroke)))
+            xy_coords = np.hstack([f_x(xx).reshape(-1, 1), f_y(xx).reshape(-1, 1)])
+        stroke_eos = np.zeros([len(xy_coords), 1])
+        stroke_eos[-1] = 1.0
+        new_coords.append(np.concatenate([xy_coords, stroke_eos], axis=1))
+    return np.vstack(new_coords)
+
+
+def legacy_layout_paths(strokes, lines, width, margins, line_gap, scale):
+    # the per-line post-processing loop of demo.Hand._layout before batching, kept as the reference
+    import drawing
+
+    LEFT = margins["left"]
+    TOP = margins["top"]
+    WRITING_AREA_WIDTH = width - margins["left"] - margins["right"]
+    BASELINE_OFFSET = -15
+    DEFAULT_X_STRETCH = 1.30
+
+    paths = []
+    y_cursor = TOP + line_gap
+    for i, (offsets, text) in enumerate(zip(strokes, lines)):
+        if not text:
+            y_cursor += line_gap
+            continue
+        offsets = offsets.copy()
+        offsets[:, :2] *= scale
+        coords = drawing.offsets_to_coords(offsets)
+        if len(coords) == 0:
+            y_cursor += line_gap
+            continue
+        try:
+            denoised = drawing.denoise(coords)
+            if len(denoised) > 2:
+                coords = denoised
+        except Exception:
+            pass
+        try:
+            if len(coords) > 2:
+                coords[:, :2] = drawing.align(coords[:, :2])
+        except Exception:
+            pass
+        coords[:, 1] *= -1
+        coords[:, 0] -= coords[:, 0].min()
+
+        current_width = coords[:, 0].max()
+        is_last_line = (i == len(lines) - 1)
+        fill_ratio = current_width * DEFAULT_X_STRETCH / WRITING_AREA_WIDTH
+        if fill_ratio > 0.65 and not is_last_line:
+            final_stretch = min(WRITING_AREA_WIDTH / current_width, 1.8)
+        else:
+            final_stretch = DEFAULT_X_STRETCH
+        coords[:, 0] *= final_stretch
+        coords[:, 0] += LEFT
+        coords[:, 1] += y_cursor + BASELINE_OFFSET
+        paths.append(coords)
+        y_cursor += line_gap
+    return paths
+
+
+def random_output_mixture(batch_size, num_components=20, seed=0):
+    """Output-mixture parameters shaped like LSTMAttentionCell._parse_parameters returns them."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    pis = rng.dirichlet(np.full(num_components, 0.3), size=batch_size)
+    pis = np.where(pis < .01, 0.0, pis)
+    mus = rng.normal(scale=2.0, size=[batch_size, 2*num_components])
+    sigmas = np.exp(rng.normal(scale=0.5, size=[batch_size, 2*num_components]))
+    rhos = np.tanh(rng.normal(size=[batch_size, num_components]))
+    es = rng.uniform(0.0, 0.5, size=[batch_size, 1])
+    return [p.astype(np.float32) for p in (pis, mus, sigmas, rhos, es)]
+
+
+def legacy_sample_output_mixture(pis, mus, sigmas, rhos, es):
+    # LSTMAttentionCell.output_function before sampling only the drawn component, needs tensorflow-probability
+    import tensorflow.compat.v1 as tf
+    import tensorflow_probability.python.distributions as tfd
+
+    batch_size, num_components = tf.shape(pis)[0], tf.shape(pis)[1]
+    mu1, mu2 = tf.split(mus, 2, axis=1)
+    mus = tf.stack([mu1, mu2], axis=2)
+    sigma1, sigma2 = tf.split(sigmas, 2, axis=1)
+    covar_matrix = [tf.square(sigma1), rhos*sigma1*sigma2, rhos*sigma1*sigma2, tf.square(sigma2)]
+    covar_matrix = tf.reshape(tf.stack(covar_matrix, axis=2), (batch_size, num_components, 2, 2))
+
+    mvn = tfd.MultivariateNormalFullCovariance(loc=mus, covariance_matrix=covar_matrix)
+    sampled_e = tfd.Bernoulli(probs=es).sample()
+    sampled_coords = mvn.sample()
+    sampled_idx = tfd.Categorical(probs=pis).sample()
+    coords = tf.gather_nd(sampled_coords, tf.stack([tf.range(batch_size), sampled_idx], axis=1))
+    return tf.concat([coords, tf.cast(sampled_e, tf.float32)], axis=1)
+
+
+def legacy_rnn_free_run(cell, initial_state, sequence_length, initial_input=None, scope='dynamic-rnn-free-run',
+                        record_states=False):
+    # rnn_ops.rnn_free_run before sampling once per step, kept as the reference implementation:
+    # termination_condition draws its own sample besides the one emitted and fed back
+    import tensorflow.compat.v1 as tf
+    from tensorflow.python.ops import array_ops, math_ops
+    from tensorflow.python.ops import variable_scope as vs
+    from rnn_ops import raw_rnn
+
+    with vs.variable_scope(scope, reuse=True):
+        if initial_input is None:
+            initial_input = cell.output_function(initial_state)
+
+    def loop_fn(time, cell_output, cell_state, loop_state):
+        next_cell_state = initial_state if cell_output is None else cell_state
+
+        terminated = cell.termination_condition(next_cell_state)
+        if loop_state is not None:
+            terminated = math_ops.logical_or(loop_state, terminated)
+        elements_finished = math_ops.logical_or(time >= sequence_length, terminated)
+
+        next_input = tf.cond(
+            math_ops.reduce_all(terminated),
+            lambda: array_ops.zeros_like(initial_input),
+            lambda: initial_input if cell_output is None else cell.output_function(next_cell_state)
+        )
+        emit_output = next_input[0] if cell_output is None else next_input
+
+        return (elements_finished, next_input, next_cell_state, emit_output, terminated)
+
+    return raw_rnn(cell, loop_fn, scope=scope, record_states=record_states)
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from numpy_engine import NumpyEngine
+
+
+def test_band_matches_full_window_around_kappa(random_weights):
+    full, banded = NumpyEngine(random_weights), NumpyEngine(random_weights, attention_band=32)
+    rng = np.random.default_rng(0)
+    batch_size, k = 6, full.num_attn_mixture_components
+    chars = rng.integers(1, full.window_size, [batch_size, 120])
+    values = full.attention_values(chars, np.full(batch_size, 120))
+
+    # components a few characters apart with gaussians a few characters wide, as in a trained model,
+    # including windows at both ends of the text where the band is clipped
+    center = np.array([0.0, 3.0, 40.0, 77.5, 115.0, 119.0])[:, None]
+    kappa = (center + rng.uniform(-3, 3, [batch_size, k])).astype(np.float32)
+    alpha = rng.uniform(0.1, 1.0, [batch_size, k]).astype(np.float32)
+    beta = rng.uniform(0.5, 4.0, [batch_size, k]).astype(np.float32)
+
+    w, phi = full.attention_window(alpha, beta, kappa, values)
+    w_band, phi_band = banded.attention_window(alpha, beta, kappa, values)
+    np.testing.assert_allclose(w_band, w, atol=1e-5)
+    np.testing.assert_allclose(phi_band, phi, atol=1e-5)
+
+
+def test_full_window_is_the_default(random_weights):
+    pytest.importorskip('svgwrite')
+    from demo import Hand
+
+    assert Hand(engine='numpy', weights_path=random_weights, prime_cache_size=0).engine.attention_band is None
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+
+import drawing
+from reference import (
+    legacy_denoise, legacy_interpolate, legacy_layout_paths, synthetic_page_offsets, synthetic_strokes
+)
+
+
+def stroke_cases():
+    cases = [synthetic_strokes(n, seed, dtype) for seed, n in enumerate((1, 3, 7, 50, 600)) for dtype in ('float32', 'float64')]
+    # a last stroke without eos, and one that ends exactly on the final point
+    cases += [c.copy() for c in cases[-2:]]
+    cases[-2][-1, 2], cases[-1][-1, 2] = 0, 1
+    return cases
+
+
+@pytest.mark.parametrize('coords', stroke_cases())
+@pytest.mark.parametrize('function, reference', [
+    (drawing.denoise, legacy_denoise),
+    (drawing.interpolate, legacy_interpolate),
+])
+def test_matches_per_stroke_loop(coords, function, reference):
+    expected, actual = reference(coords), function(coords)
+    assert actual.shape == expected.shape and actual.dtype == expected.dtype
+    np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)
+
+
+def test_batch_functions_match_per_line():
+    lines = [synthetic_strokes(n, seed, 'float64') for seed, n in enumerate((0, 1, 2, 3, 7, 50, 600))]
+    batch, lengths = drawing.pad_strokes(lines)
+    denoised = drawing.batch_denoise(batch, lengths)
+    aligned = drawing.batch_align(batch, lengths)
+    for coords, n, d, a in zip(lines, lengths, denoised, aligned):
+        if n > 2:
+            np.testing.assert_allclose(d[:n], drawing.denoise(coords), rtol=1e-6, atol=1e-6)
+            np.testing.assert_allclose(a[:n], drawing.align(coords), rtol=1e-6, atol=1e-6)
+        else:
+            np.testing.assert_array_equal(d[:n], coords)
+            np.testing.assert_array_equal(a[:n], coords)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_layout_matches_per_line_loop(seed):
+    pytest.importorskip('svgwrite')
+    from demo import Hand
+
+    width, height, line_gap, scale = 1860, 3508, 100, 1.5
+    margins = {"top": 200, "bottom": 120, "left": 140, "right": 60}
+    strokes, lines = synthetic_page_offsets(seed=100 * seed)
+    expected = legacy_layout_paths(strokes, lines, width, margins, line_gap, scale)
+    _, actual = Hand._layout(strokes, lines, width, height, margins, False, line_gap, scale)
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a.shape == e.shape
+        np.testing.assert_allclose(a, e, rtol=1e-6, atol=1e-6)
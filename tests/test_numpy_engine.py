@@ -0,0 +1,150 @@
+import numpy as np
+import pytest
+
+from cell_state import CARRIED_STATE_FIELDS, LSTMAttentionCellState
+from numpy_engine import WEIGHT_NAMES, NumpyEngine
+
+tf = pytest.importorskip('tensorflow.compat.v1')
+
+
+def random_inputs(engine, batch_size=4, char_len=30, seed=1):
+    """Characters, a carried state and one input point, as fed to a step in the middle of a line."""
+    rng = np.random.default_rng(seed)
+    chars = rng.integers(1, engine.window_size, [batch_size, char_len])
+    chars_len = np.array([char_len, 21, 9, 1][:batch_size])
+    sizes = engine.state_sizes
+    state = {f: rng.normal(size=[batch_size, sizes[f]]).astype(np.float32) for f in CARRIED_STATE_FIELDS}
+    state['alpha'], state['beta'] = np.abs(state['alpha']), np.abs(state['beta'])
+    state['kappa'] = np.abs(state['kappa']) * 5
+    inputs = np.concatenate([rng.normal(size=[batch_size, 2]), rng.random([batch_size, 1]) < .1], axis=1)
+    return chars, chars_len, state, inputs.astype(np.float32)
+
+
+def tensorflow_step(engine, weights_path, chars, chars_len, state, inputs, bias):
+    """One LSTMAttentionCell step and its output-mixture parameters, with the engine's weights loaded."""
+    from rnn_cell import LSTMAttentionCell
+    from tf_utils import dense_layer
+
+    with tf.Graph().as_default(), tf.Session() as session:
+        cell = LSTMAttentionCell(
+            lstm_size=engine.lstm_size,
+            num_attn_mixture_components=engine.num_attn_mixture_components,
+            attention_values=tf.one_hot(chars, engine.window_size),
+            attention_values_lengths=tf.constant(chars_len, dtype=tf.int32),
+            num_output_mixture_components=engine.num_output_mixture_components,
+            bias=tf.constant(bias),
+            attention_band=engine.attention_band
+        )
+        carried = {f: tf.constant(v) for f, v in state.items()}
+        attended = cell.attend(LSTMAttentionCellState(w=None, phi=None, **carried))
+        with tf.variable_scope('rnn', reuse=tf.AUTO_REUSE):
+            _, next_state = cell(tf.constant(inputs), attended)
+            params = dense_layer(next_state.h3, cell.output_units, scope='gmm', reuse=tf.AUTO_REUSE)
+        mixture = cell._parse_parameters(params)
+
+        weights = np.load(weights_path)
+        variables = {v.op.name: v for v in tf.global_variables()}
+        session.run([variables[name].assign(weights[key]) for key, name in WEIGHT_NAMES.items()])
+        next_state, mixture = session.run([next_state, mixture])
+    return next_state._asdict(), mixture
+
+
+@pytest.mark.parametrize('attention_band', [None, 8])
+def test_step_matches_tensorflow(random_weights, attention_band):
+    engine = NumpyEngine(random_weights, attention_band=attention_band)
+    chars, chars_len, state, inputs = random_inputs(engine)
+    bias = np.full(len(chars), 0.75, dtype=np.float32)
+
+    expected, expected_mixture = tensorflow_step(engine, random_weights, chars, chars_len, state, inputs, bias)
+    values = engine.attention_values(chars, chars_len)
+    actual = engine.step(inputs, engine.attend(state, values), values)
+    for f in LSTMAttentionCellState._fields:
+        np.testing.assert_allclose(actual[f], expected[f], rtol=1e-4, atol=1e-5, err_msg=f)
+
+    mixture = engine.output_parameters(actual['h3'], bias)
+    for name, a, e in zip(('pis', 'mus', 'sigmas', 'rhos', 'es'), mixture, expected_mixture):
+        np.testing.assert_allclose(a, e, rtol=1e-4, atol=1e-5, err_msg=name)
+
+
+@pytest.fixture(scope='module')
+def tf_model(random_weights, tmp_path_factory):
+    """The inference graph of rnn.rnn, as Hand builds it, with the random test weights loaded."""
+    import logging
+    from rnn import rnn
+
+    engine = NumpyEngine(random_weights)
+    root = tmp_path_factory.mktemp('tf_model')
+    nn = rnn(
+        log_dir=str(root / 'logs'), checkpoint_dir=str(root / 'checkpoints'), prediction_dir=str(root / 'predictions'),
+        learning_rates=[.0001], batch_sizes=[32], patiences=[1], beta1_decays=[.9], validation_batch_size=32,
+        optimizer='rms', num_training_steps=1, warm_start_init_step=0, regularization_constant=0.0, keep_prob=1.0,
+        enable_parameter_averaging=False, min_steps_to_checkpoint=1, log_interval=1, logging_level=logging.CRITICAL,
+        grad_clip=10, lstm_size=engine.lstm_size, output_mixture_components=engine.num_output_mixture_components,
+        attention_mixture_components=engine.num_attn_mixture_components, inference_only=True,
+        record_sample_states=True
+    )
+    weights = np.load(random_weights)
+    with nn.graph.as_default():
+        variables = {v.op.name: v for v in tf.global_variables()}
+        nn.session.run([variables[name].assign(weights[key]) for key, name in WEIGHT_NAMES.items()])
+    yield nn
+    nn.session.close()
+
+
+def random_priming(engine, seed=2):
+    """Stroke sequences of different lengths and their transcriptions, like Hand._prime feeds."""
+    rng = np.random.default_rng(seed)
+    x_prime_len = np.array([120, 37, 1, 80])
+    x_prime = np.concatenate([0.5*rng.normal(size=[4, 150, 2]), rng.random([4, 150, 1]) < .05], axis=2)
+    x_prime[np.arange(150) >= x_prime_len[:, None]] = 0.0
+    chars = rng.integers(1, engine.window_size, [4, 40])
+    chars_len = np.array([40, 12, 3, 25])
+    return x_prime.astype(np.float32), x_prime_len, chars, chars_len
+
+
+def test_prime_matches_tensorflow(random_weights, tf_model):
+    engine = NumpyEngine(random_weights)
+    x_prime, x_prime_len, chars, chars_len = random_priming(engine)
+
+    nn = tf_model
+    expected = nn.session.run(nn.primed_state, feed_dict={
+        nn.x_prime: x_prime, nn.x_prime_len: x_prime_len, nn.num_samples: len(x_prime),
+        nn.c: chars, nn.c_len: chars_len,
+    })
+    actual = engine.prime(x_prime, x_prime_len, chars, chars_len)
+    for f in CARRIED_STATE_FIELDS:
+        np.testing.assert_allclose(actual[f], getattr(expected, f), rtol=1e-4, atol=1e-4, err_msg=f)
+
+
+def test_steps_match_recorded_tensorflow_run(random_weights, tf_model):
+    engine = NumpyEngine(random_weights)
+    x_prime, x_prime_len, chars, chars_len = random_priming(engine)
+    primed = engine.prime(x_prime, x_prime_len, chars, chars_len)
+    bias = np.full(len(chars), 0.75, dtype=np.float32)
+
+    # one TensorFlow free run with its per-step states recorded, then the NumPy step teacher-forced
+    # with the points TensorFlow sampled has to land on every recorded state
+    nn = tf_model
+    initial_input = np.tile([[0.0, 0.0, 1.0]], [len(chars), 1]).astype(np.float32)
+    feed_dict = {getattr(nn.sample_state, f): primed[f] for f in CARRIED_STATE_FIELDS}
+    feed_dict.update({
+        nn.num_samples: len(chars), nn.sample_tsteps: 60, nn.c: chars, nn.c_len: chars_len,
+        nn.bias: bias, nn.sample_input: initial_input,
+    })
+    recorded, samples = nn.session.run([nn.sampled_states, nn.sampled_from_state], feed_dict=feed_dict)
+
+    values = engine.attention_values(chars, chars_len)
+    state = engine.attend(primed, values)
+    inputs = np.concatenate([initial_input[:, None], samples[:, :-1]], axis=1)
+    for t in range(samples.shape[1]):
+        # lines that terminated emit zeros and are no longer stepped the same way
+        running = np.any(samples[:, t] != 0.0, axis=1)
+        state = engine.step(inputs[:, t], state, values)
+        for f in ('h3', 'kappa', 'phi'):
+            np.testing.assert_allclose(
+                state[f][running], getattr(recorded, f)[running, t], rtol=1e-3, atol=1e-3, err_msg='{} at step {}'.format(f, t)
+            )
+        # and end the lines TensorFlow ended, on the point it sampled
+        if t + 1 < samples.shape[1]:
+            terminated = engine.terminated(state, samples[:, t], chars_len)
+            np.testing.assert_array_equal(terminated[running], ~np.any(samples[running, t + 1] != 0.0, axis=1))
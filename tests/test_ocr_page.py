@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip('PIL')
+pytest.importorskip('torch')
+pytest.importorskip('transformers')
+pytest.importorskip('streamlit')
+
+from reference import legacy_find_text, synthetic_page
+
+
+def pages():
+    pages = [synthetic_page(num_lines, seed=seed) for seed, num_lines in enumerate((30, 25, 12, 40))]
+    # text running into the bottom edge leaves a band that never closes
+    pages.append(pages[0].crop((0, 0, pages[0].width, pages[0].height // 2 - 30)))
+    return pages
+
+
+def test_line_boxes_match_reference_loop():
+    import ocr_page
+
+    for page in pages():
+        assert ocr_page.remove_lines_and_find_text(page) == legacy_find_text(page)
+
+
+def test_split_at_gaps_cuts_only_between_ink():
+    import numpy as np
+    import ocr_page
+
+    has_ink = np.zeros(290, dtype=bool)
+    has_ink[20:150] = True
+    has_ink[160:280] = True
+    assert ocr_page.split_at_gaps(has_ink, 10, 290, max_width=100, min_gap=5) == [(10, 155), (155, 290)]
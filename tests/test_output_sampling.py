@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from reference import random_output_mixture
+
+ks_2samp = pytest.importorskip('scipy.stats').ks_2samp
+
+NUM_SAMPLES = 20000
+
+
+def reference_samples(params, num_samples, seed=0):
+    """Draws from one mixture with numpy's multivariate normal on each component's full 2x2 covariance."""
+    rng = np.random.default_rng(seed)
+    pis, mus, sigmas, rhos, es = [p.astype(np.float64) for p in params]
+    k = pis.shape[0]
+    counts = rng.multinomial(num_samples, pis / pis.sum())
+    coords = []
+    for j in np.flatnonzero(counts):
+        s1, s2, rho = sigmas[j], sigmas[k + j], rhos[j]
+        cov = [[s1*s1, rho*s1*s2], [rho*s1*s2, s2*s2]]
+        coords.append(rng.multivariate_normal([mus[j], mus[k + j]], cov, size=counts[j]))
+    coords = np.concatenate(coords)
+    eos = rng.random(num_samples) < es[0]
+    return np.concatenate([coords, eos[:, None]], axis=1)
+
+
+def assert_same_distribution(actual, expected, eos_rate):
+    # x + y is sensitive to the correlation rho as well as to the marginals
+    for a, e in ((actual[:, 0], expected[:, 0]), (actual[:, 1], expected[:, 1]),
+                 (actual[:, 0] + actual[:, 1], expected[:, 0] + expected[:, 1])):
+        assert ks_2samp(a, e).pvalue > 1e-3
+    assert abs(actual[:, 2].mean() - eos_rate) < 0.02
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_closed_form_sampler_matches_full_mixture(seed):
+    tf = pytest.importorskip('tensorflow.compat.v1')
+    from rnn_cell import sample_output_mixture
+
+    # every row of the batch is the same mixture, so one run draws NUM_SAMPLES points from it
+    params = random_output_mixture(1, seed=seed)
+    with tf.Graph().as_default(), tf.Session() as session:
+        tf.set_random_seed(seed)
+        tiled = [tf.tile(tf.constant(p), [NUM_SAMPLES, 1]) for p in params]
+        actual = session.run(sample_output_mixture(*tiled))
+    expected = reference_samples([p[0] for p in params], NUM_SAMPLES, seed=seed)
+    assert_same_distribution(actual, expected, params[4][0, 0])
+
+
+def test_numpy_sampler_matches_full_mixture(random_weights):
+    from numpy_engine import NumpyEngine
+
+    engine = NumpyEngine(random_weights, seed=0)
+    h3 = np.repeat(np.random.default_rng(0).normal(size=[1, engine.lstm_size]).astype(np.float32), NUM_SAMPLES, axis=0)
+    bias = np.full(NUM_SAMPLES, 0.75, dtype=np.float32)
+    params = [p[0] for p in engine.output_parameters(h3[:1], bias[:1])]
+    actual = engine.sample_output(h3, bias)
+    assert_same_distribution(actual, reference_samples(params, NUM_SAMPLES), params[4][0])
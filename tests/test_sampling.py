@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('svgwrite')
+
+
+def sample(weights, lines, segment_tsteps, seed=0, biases=None):
+    from demo import Hand
+
+    hand = Hand(engine='numpy', weights_path=weights, prime_cache_size=0, segment_tsteps=segment_tsteps)
+    hand.engine.rng = np.random.default_rng(seed)
+    return hand._sample(lines, biases=biases or [0.75] * len(lines))
+
+
+def test_segmented_run_matches_single_run(random_weights):
+    lines = ['a short line', 'a somewhat longer line of text', 'hi']
+    whole = sample(random_weights, lines, segment_tsteps=0)
+    segmented = sample(random_weights, lines, segment_tsteps=50)
+
+    assert max(len(s) for s in whole) > 50
+    assert [len(s) for s in segmented] == [len(s) for s in whole]
+    for a, b in zip(segmented, whole):
+        np.testing.assert_allclose(a, b, rtol=1e-5, atol=1e-5)
+
+
+def test_unstyled_sampling_has_no_nans(random_weights):
+    strokes = sample(random_weights, ['hello there'], segment_tsteps=0)
+    assert len(strokes[0]) and not np.isnan(strokes[0]).any()
+
+
+def test_missing_bias_is_zero(random_weights):
+    lines = ['a short line', 'hi']
+    missing = sample(random_weights, lines, segment_tsteps=0, biases=[None, 0.75])
+    explicit = sample(random_weights, lines, segment_tsteps=0, biases=[0.0, 0.75])
+    for a, b in zip(missing, explicit):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_layout_of_blank_page():
+    from demo import Hand
+    margins = {'left': 10, 'right': 10, 'top': 10, 'bottom': 10}
+    rules, paths = Hand._layout([np.zeros([0, 3]), np.zeros([0, 3])], ['', ''], 200, 200, margins, True, 30, 1.)
+    assert rules and paths == []
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from scheduler import SynthesisScheduler
+
+
+class FakeHand(object):
+
+    """Stands in for demo.Hand: style 13 doesn't exist, and a line 'boom' fails at sampling time."""
+
+    def _validate_request(self, lines, biases=None, styles=None):
+        if styles and 13 in styles:
+            raise ValueError('unknown style id(s) [13]')
+
+    def _sample(self, lines, biases=None, styles=None):
+        self.biases = biases
+        if 'boom' in lines:
+            raise RuntimeError('boom')
+        return [np.full([len(line), 3], len(line)) for line in lines]
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = SynthesisScheduler(FakeHand(), max_wait=0.2)
+    yield scheduler
+    scheduler.close()
+
+
+def test_invalid_request_is_rejected_on_submit(scheduler):
+    with pytest.raises(ValueError):
+        scheduler.submit(['bad style'], styles=[13])
+    assert [len(s) for s in scheduler.sample(['ok', 'fine'], styles=[0, 0])] == [2, 4]
+
+
+def test_failure_stays_with_its_line(scheduler):
+    good = scheduler.submit(['one', 'three'], styles=[0, 0])
+    bad = scheduler.submit(['boom'], styles=[0])
+    assert [len(f.result()) for f in good] == [3, 5]
+    with pytest.raises(RuntimeError):
+        bad[0].result()
+
+
+def test_missing_bias_is_left_to_hand(scheduler):
+    scheduler.sample(['one', 'two'], biases=[None, 0.5], styles=[0, 0])
+    assert scheduler.hand.biases == [None, 0.5]
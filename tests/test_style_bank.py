@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import drawing
+
+pytest.importorskip('svgwrite')
+
+TRANSCRIPTIONS = ['the quick brown fox', 'pack my box with five', 'zig']
+
+
+@pytest.fixture
+def styles_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    for i, text in enumerate(TRANSCRIPTIONS):
+        n = 40 * len(text)
+        strokes = np.concatenate([rng.normal(size=[n, 2]), rng.random([n, 1]) < .05], axis=1)
+        np.save(str(tmp_path / 'style-{}-strokes.npy'.format(i)), strokes.astype(np.float32))
+        np.save(str(tmp_path / 'style-{}-chars.npy'.format(i)), np.frombuffer(text.encode(), dtype=np.uint8))
+    return tmp_path
+
+
+def primed_batches(random_weights, styles_dir, lines, styles, prime_cache_size):
+    """Samples lines and returns the (x_prime, x_prime_len, chars, chars_len) of every priming call."""
+    from demo import Hand
+    from style_bank import StyleBank
+
+    hand = Hand(engine='numpy', weights_path=random_weights, prime_cache_size=prime_cache_size)
+    hand.style_bank = StyleBank(str(styles_dir))
+    calls = []
+    prime = hand.engine.prime
+
+    def recording_prime(*args):
+        calls.append([np.array(a) for a in args])
+        return prime(*args)
+
+    hand.engine.prime = recording_prime
+    hand._sample(lines, biases=[0.75] * len(lines), styles=styles)
+    return calls
+
+
+def assert_batch_matches_style_files(styles_dir, batch, styles, texts):
+    x_prime, x_prime_len, chars, chars_len = batch
+    assert len(x_prime) == len(styles)
+    for i, (style, text) in enumerate(zip(styles, texts)):
+        strokes = np.load(str(styles_dir / 'style-{}-strokes.npy'.format(style)))
+        transcription = np.load(str(styles_dir / 'style-{}-chars.npy'.format(style))).tobytes().decode('utf-8')
+        encoded = drawing.encode_ascii(transcription + ' ' + text)
+
+        assert x_prime_len[i] == len(strokes)
+        np.testing.assert_array_equal(x_prime[i, :len(strokes)], strokes)
+        assert not x_prime[i, len(strokes):].any()
+        assert chars_len[i] == len(encoded)
+        np.testing.assert_array_equal(chars[i, :len(encoded)], encoded)
+        assert not chars[i, len(encoded):].any()
+
+
+@pytest.mark.parametrize('styles', [[1] * 4, [0, 1, 2, 1]])
+def test_priming_batch_without_cache(random_weights, styles_dir, styles):
+    # every line is primed on its style's strokes, attending over the transcription and its own text
+    lines = ['hello', 'a longer line of text', '', 'x']
+    calls = primed_batches(random_weights, styles_dir, lines, styles, prime_cache_size=0)
+    assert len(calls) == 1
+    assert_batch_matches_style_files(styles_dir, calls[0], styles, lines)
+
+
+def test_priming_batch_with_cache(random_weights, styles_dir):
+    # each style is primed once, over its transcription alone
+    calls = primed_batches(random_weights, styles_dir, ['hello', 'there', 'x'], [2, 0, 2], prime_cache_size=4)
+    assert len(calls) == 1
+    assert_batch_matches_style_files(styles_dir, calls[0], [0, 2], ['', ''])
@@ -47,6 +47,9 @@ class TFBaseModel(object):
         log_dir: Directory where logs are written.
         checkpoint_dir: Directory where checkpoints are saved.
         prediction_dir: Directory where predictions/outputs are saved.
+        inference_only:  If true, only the graph returned by self.calculate_inference() is built,
+            along with a Saver for restoring parameters.  The loss, optimizer, gradients and
+            parameter averaging ops are skipped, so the model can be restored but not trained.
     """
 
     def __init__(
@@ -71,6 +74,7 @@ class TFBaseModel(object):
         log_dir='logs',
         checkpoint_dir='checkpoints',
         prediction_dir='predictions',
+        inference_only=False,
     ):
 
         assert len(batch_sizes) == len(learning_rates) == len(patiences)
@@ -94,6 +98,7 @@ class TFBaseModel(object):
         self.log_interval = log_interval
         self.loss_averaging_window = loss_averaging_window
         self.validation_batch_size = validation_batch_size
+        self.inference_only = inference_only
 
         self.log_dir = log_dir
         self.logging_level = logging_level
@@ -118,7 +123,11 @@ class TFBaseModel(object):
     def calculate_loss(self):
         raise NotImplementedError('subclass must implement this')
 
+    def calculate_inference(self):
+        raise NotImplementedError('subclass must implement this to be built with inference_only')
+
     def fit(self):
+        assert not self.inference_only, 'model was built with inference_only and cannot be trained'
         with self.session.as_default():
 
             if self.warm_start_init_step:
@@ -318,6 +327,8 @@ class TFBaseModel(object):
         saver.save(self.session, model_path, global_step=step)
 
     def restore(self, step=None, averaged=False):
+        if averaged and not self.enable_parameter_averaging:
+            raise ValueError('restoring averaged parameters requires enable_parameter_averaging=True')
         saver = self.saver_averaged if averaged else self.saver
         checkpoint_dir = self.checkpoint_dir_averaged if averaged else self.checkpoint_dir
         if not step:
@@ -330,6 +341,7 @@ class TFBaseModel(object):
             )
             logging.info('restoring model from {}'.format(model_path))
             saver.restore(self.session, model_path)
+        self.restored_model_path = model_path
 
     def init_logging(self, log_dir):
         if not os.path.isdir(log_dir):
@@ -391,6 +403,15 @@ class TFBaseModel(object):
 
     def build_graph(self):
         with tf.Graph().as_default() as graph:
+            if self.inference_only:
+                self.calculate_inference()
+                self.saver = tf.train.Saver(max_to_keep=1)
+                if self.enable_parameter_averaging:
+                    # averaged checkpoints store each variable under its moving average's name
+                    self.ema = tf.train.ExponentialMovingAverage(decay=0.99)
+                    self.saver_averaged = tf.train.Saver(self.ema.variables_to_restore(), max_to_keep=1)
+                return graph
+
             self.ema = tf.train.ExponentialMovingAverage(decay=0.99)
             self.global_step = tf.Variable(0, trainable=False)
             self.learning_rate_var = tf.Variable(0.0, trainable=False)